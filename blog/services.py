@@ -0,0 +1,43 @@
+from random import sample
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from blog.models import Blog
+
+FEATURED_POOL_CACHE_KEY = 'blog_featured_pool'
+FEATURED_CARDS_CACHE_KEY = 'blog_featured_cards'
+
+
+def get_featured_pool():
+    """id последних постов, из которых выбираются посты для главной. Запрос к БД - только после
+    добавления или удаления поста (или по таймауту), а не на каждый показ главной"""
+    pool = cache.get(FEATURED_POOL_CACHE_KEY)
+    if pool is None:
+        pool = list(Blog.objects.order_by('-pk').values_list('pk', flat=True)[:settings.BLOG_FEATURED_POOL_SIZE])
+        cache.set(FEATURED_POOL_CACHE_KEY, pool, settings.BLOG_FEATURED_POOL_TIMEOUT)
+    return pool
+
+
+def get_featured_posts():
+    """Случайные посты для главной; если постов меньше, чем нужно, - все, что есть"""
+    pool = get_featured_pool()
+    pks = sample(pool, min(settings.BLOG_FEATURED_COUNT, len(pool)))
+    if not pks:
+        return []
+    return list(Blog.objects.filter(pk__in=pks).select_related('owner'))
+
+
+def get_featured_cards():
+    """Готовый HTML карточек постов для главной, один и тот же для всех на BLOG_FEATURED_CARDS_TIMEOUT секунд"""
+    cards = cache.get(FEATURED_CARDS_CACHE_KEY)
+    if cards is None:
+        cards = render_to_string('blog/includes/featured_posts.html', {'object_list': get_featured_posts()})
+        cache.set(FEATURED_CARDS_CACHE_KEY, cards, settings.BLOG_FEATURED_CARDS_TIMEOUT)
+    return cards
+
+
+def invalidate_featured(pool=True):
+    """Сбрасывает карточки постов и, если pool, список id постов"""
+    cache.delete_many([FEATURED_POOL_CACHE_KEY, FEATURED_CARDS_CACHE_KEY] if pool else [FEATURED_CARDS_CACHE_KEY])
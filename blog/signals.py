@@ -0,0 +1,19 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from blog.models import Blog
+from blog.services import invalidate_featured
+
+
+@receiver(post_save, sender=Blog)
+def blog_saved(sender, created, **kwargs):
+    """Новый пост попадает в список постов для главной. Остальные сохранения (в том числе счётчик
+    просмотров при каждом открытии поста) кеш не сбрасывают, карточки обновятся по таймауту"""
+    if created:
+        invalidate_featured()
+
+
+@receiver(post_delete, sender=Blog)
+def blog_deleted(sender, **kwargs):
+    """Удалённый пост сразу убирается с главной"""
+    invalidate_featured()
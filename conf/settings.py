@@ -150,17 +150,91 @@ EMAIL_USE_SSL = True
 SERVER_EMAIL = EMAIL_HOST_USER
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 EMAIL_ADMIN = EMAIL_HOST_USER
+# пул SMTP-релеев, письма распределяются по весу и скорости, при сбое релея - переотправляются через другие:
+# [{'name': 'yandex', 'host': 'smtp.yandex.ru', 'port': 465, 'username': ..., 'password': ..., 'use_ssl': True,
+#   'weight': 2, 'from_email': ..., 'rate': 5, 'burst': 20}, ...]
+# rate и burst - лимит скорости релея (получателей в секунду и размер всплеска), по умолчанию MAILING_SMTP_RATE/BURST
+# пустой список - единственный релей из EMAIL_HOST / EMAIL_HOST_USER
+MAILING_SMTP_RELAYS = []
+MAILING_RELAY_COOLDOWN = 60  # на сколько секунд выводить из работы сбойный релей
+MAILING_IMPORT_BATCH_SIZE = 1000  # по сколько строк файла проверять и добавлять клиентов при импорте
+MAILING_EXPORT_CHUNK_SIZE = 2000  # по сколько строк читать из базы при выгрузке в CSV/JSONL
+MAILING_EDITOR_PAGE_SIZE = 50  # клиентов на странице редактора списка рассылки
+MAILING_ESTIMATED_COUNT = True  # в списках показывать оценку числа записей по статистике PostgreSQL вместо COUNT(*)
+MAILING_LOG_RETENTION_MONTHS = 12  # сколько месяцев хранить журнал рассылок, итоги по дням (LogDaily) остаются
+MAILING_LOG_DAILY_DAYS = 14  # за сколько дней показывать итоги рассылок над журналом
+MAILING_LOG_PARTITIONS_AHEAD = 2  # на сколько месяцев вперёд создавать разделы журнала (PostgreSQL)
+MAILING_RECIPIENTS_PER_MESSAGE = 1  # сколько получателей в одном письме (1 - отдельное письмо каждому клиенту)
+MAILING_RECIPIENTS_CHUNK_SIZE = 2000  # по сколько адресов за раз читать из БД при выгрузке получателей
+MAILING_WORKERS = 4  # сколько потоков (и SMTP-соединений) одновременно отправляют письма
+# вместо потоков отправлять письма через asyncio (mailing.backends.AsyncSMTPBackend)
+MAILING_ASYNC_DELIVERY = os.getenv("MAILING_ASYNC_DELIVERY") == 'True'
+MAILING_ASYNC_CONCURRENCY = 10  # сколько SMTP-сессий asyncio-бэкенд держит одновременно
+MAILING_RATE_LIMIT = 0  # не больше стольких писем в секунду на SMTP-хост (0 - без ограничения)
+# токен для сбора метрик /metrics/ (Prometheus: authorization: {credentials: ...}), без него метрики видит только персонал
+MAILING_METRICS_TOKEN = os.getenv("MAILING_METRICS_TOKEN")
 
 USE_TZ = False  # использовать в моделях текущий часовой пояс
 
-CRONJOBS = [('0-59 * * * *', 'mailing.mailing_functions.check_adn_run_mailings')]
+CRONJOBS = [
+    ('0-59 * * * *', 'mailing.services.check_adn_run_mailings'),
+    ('30 3 * * *', 'mailing.retention.maintain_logs'),
+    ('15 * * * *', 'mailing.stats.reconcile_owner_stats'),
+    ('45 3 * * *', 'mailing.services.purge_outbox'),
+]
+
+# если включено, cron только ставит задачи в очередь, а письма отправляют воркеры Celery:
+# celery -A conf worker -l info
+# планировщики на нескольких серверах делят рассылки по id: MAILING_SHARDS штук, у каждого свой MAILING_SHARD
+MAILING_SHARDS = int(os.getenv("MAILING_SHARDS", 1))
+MAILING_SHARD = int(os.getenv("MAILING_SHARD", 0))
+MAILING_USE_CELERY = os.getenv("MAILING_USE_CELERY") == 'True'
+MAILING_OUTBOX_BATCH_SIZE = 500  # сколько писем из очереди Outbox отправляется за один вызов
+# сколько задач отправки Celery держать одновременно (каждая отправляет пачки, пока очередь не опустеет);
+# счётчик задач хранится в кеше, поэтому с Celery нужен общий кеш (CACHE_ENABLED)
+MAILING_OUTBOX_TASKS = 4
+MAILING_OUTBOX_TASKS_TIMEOUT = 60 * 10  # через сколько секунд счётчик задач сбрасывается, если задачи пропали
+MAILING_OUTBOX_CANDIDATES_FACTOR = 4  # во сколько раз больше пачки блокируется писем (поровну между пользователями)
+MAILING_OUTBOX_LEASE = 300  # на сколько секунд письма забираются в отправку, после этого их возьмёт другой процесс
+MAILING_OUTBOX_RESULT_GROUP = 100  # итоги отправки записываются после каждой такой группы сообщений
+MAILING_OUTBOX_RETENTION_DAYS = 7  # сколько дней хранить в очереди отправленные и неотправленные письма
+MAILING_OUTBOX_PURGE_CHUNK_SIZE = 5000  # по сколько писем удалять из очереди за один запрос
+MAILING_OUTBOX_ATTEMPTS = 5  # сколько раз пробовать отправить письмо при временных ошибках
+MAILING_RETRY_DELAY = 30  # задержка (сек.) перед первым повтором отправки, дальше растёт вдвое
+# лимиты скорости (писем в секунду и размер всплеска) на SMTP-релей (аккаунт) и на пользователя, 0 - без ограничения
+MAILING_SMTP_RATE = float(os.getenv("MAILING_SMTP_RATE", 0))
+MAILING_SMTP_BURST = 50
+MAILING_OWNER_RATE = float(os.getenv("MAILING_OWNER_RATE", 0))
+MAILING_OWNER_BURST = 20
+MAILING_THROTTLE_DELAY = 10  # на сколько секунд откладывать письма сверх лимита
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", 'redis://127.0.0.1:6379/0')
+CELERY_TASK_ACKS_LATE = True  # задача подтверждается только после выполнения
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'mailing': {'handlers': ['console'], 'level': 'INFO'},  # строки с метриками тиков рассылок
+    },
+}
 
 AUTH_USER_MODEL = 'users.User'
 LOGOUT_REDIRECT_URL = '/users/'  # куда редиректит django.contrib.auth после разлогинивания
 LOGIN_REDIRECT_URL = '/'  # куда редиректит django.contrib.auth после авторизации
 LOGIN_URL = '/users/'  # куда редиректи LoginRequiredMixin, если пользователь не авторизован
 
-CACHE_ENABLED = os.getenv("CACHE_ENABLED") == True
+CACHE_ENABLED = os.getenv("CACHE_ENABLED") == 'True'
+BLOG_FEATURED_COUNT = 3  # сколько случайных постов блога показывать на главной
+BLOG_FEATURED_POOL_SIZE = 1000  # из скольких последних постов выбирать
+BLOG_FEATURED_POOL_TIMEOUT = 60 * 10  # список id постов сбрасывается сигналами, таймаут - подстраховка
+BLOG_FEATURED_CARDS_TIMEOUT = 60  # сколько секунд показывать одни и те же посты
+MAILING_SCHEDULE_CACHE_TIMEOUT = 60 * 60  # снимок расписания сбрасывается сигналами, таймаут - подстраховка
+# где хранить вёдра токенов лимитов скорости, без Redis лимиты считаются в памяти каждого процесса
+MAILING_RATE_LIMIT_REDIS = os.getenv("MAILING_RATE_LIMIT_REDIS", "redis://127.0.0.1:6379" if CACHE_ENABLED else None)
 
 if CACHE_ENABLED:
     CACHES = {
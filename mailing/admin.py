@@ -1,5 +1,5 @@
 from django.contrib import admin
-from mailing.models import Client, MailingModel, Message, MailingList, LogList
+from mailing.models import Client, MailingModel, Message, MailingList, LogList, LogDaily, Outbox, MailingRun, OwnerStats
 
 
 @admin.register(Client)
@@ -26,4 +26,27 @@ class MailingListAdmin(admin.ModelAdmin):
 
 @admin.register(LogList)
 class LogListAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'time', 'error_type', 'error_message')
\ No newline at end of file
+    list_display = ('pk', 'time', 'error_type', 'error_message')
+
+
+@admin.register(LogDaily)
+class LogDailyAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'day', 'mailing_model', 'success', 'failure', 'owner')
+    list_filter = ('day', )
+
+
+@admin.register(Outbox)
+class OutboxAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'mailing_model', 'run_at', 'mail', 'status', 'attempts', 'next_attempt_at')
+    list_filter = ('status', )
+
+
+@admin.register(MailingRun)
+class MailingRunAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'mailing_model', 'run_at', 'summarized')
+    list_filter = ('summarized', )
+
+
+@admin.register(OwnerStats)
+class OwnerStatsAdmin(admin.ModelAdmin):
+    list_display = ('owner', 'mailing_amount', 'active_mailing_amount', 'client_amount', 'reconciled_at')
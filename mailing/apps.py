@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class MailingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mailing'
+
+    def ready(self):
+        import mailing.signals
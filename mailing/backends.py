@@ -0,0 +1,199 @@
+import asyncio
+import base64
+import ssl
+from smtplib import SMTPAuthenticationError, SMTPConnectError, SMTPException, SMTPResponseException, \
+    SMTPServerDisconnected
+
+from django.conf import settings
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.message import sanitize_address
+
+
+def as_connect_error(err):
+    """Ошибка подключения или авторизации как ошибка релея, чтобы письма ушли через другие релеи:
+    отказ сервера с кодом 535 - SMTPAuthenticationError, с другим кодом - SMTPConnectError"""
+    if isinstance(err, SMTPResponseException) and not isinstance(err, (SMTPAuthenticationError, SMTPConnectError)):
+        if err.smtp_code == 535:
+            return SMTPAuthenticationError(err.smtp_code, err.smtp_error)
+        return SMTPConnectError(err.smtp_code, err.smtp_error)
+    return err
+
+
+class AsyncSMTPSession:
+    """Минимальный SMTP-клиент на asyncio streams: подключение, авторизация и отправка писем"""
+
+    def __init__(self, host, port, username=None, password=None, use_ssl=False, use_tls=False, timeout=None):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_ssl = use_ssl
+        self.use_tls = use_tls
+        self.timeout = timeout or 30
+        self.reader = None
+        self.writer = None
+
+    async def connect(self):
+        ssl_context = ssl.create_default_context() if self.use_ssl else None
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=ssl_context), self.timeout
+        )
+        await self.expect(220)
+        await self.command('EHLO localhost', 250)
+        if self.use_tls:
+            await self.command('STARTTLS', 220)
+            await self.writer.start_tls(ssl.create_default_context())  # Python 3.11+
+            await self.command('EHLO localhost', 250)
+        if self.username:
+            credentials = base64.b64encode(f'\0{self.username}\0{self.password}'.encode()).decode()
+            await self.command(f'AUTH PLAIN {credentials}', 235)
+
+    async def read_reply(self):
+        """Читает (возможно многострочный) ответ сервера, возвращает код и текст"""
+        lines = []
+        while True:
+            line = await asyncio.wait_for(self.reader.readline(), self.timeout)
+            if not line:
+                raise SMTPServerDisconnected('Соединение закрыто сервером')
+            lines.append(line[4:].strip())
+            if line[3:4] != b'-':
+                return int(line[:3]), b'\n'.join(lines)
+
+    async def expect(self, *codes):
+        code, text = await self.read_reply()
+        if code not in codes:
+            raise SMTPResponseException(code, text)
+        return code, text
+
+    async def command(self, line, *codes):
+        self.writer.write(line.encode() + b'\r\n')
+        await self.writer.drain()
+        return await self.expect(*codes)
+
+    async def send(self, message):
+        """Отправляет одно письмо (django EmailMessage)"""
+        encoding = message.encoding or settings.DEFAULT_CHARSET
+        from_email = sanitize_address(message.from_email, encoding)
+        recipients = [sanitize_address(address, encoding) for address in message.recipients()]
+        if not recipients:
+            return
+        try:
+            await self.command(f'MAIL FROM:<{from_email}>', 250)
+            for recipient in recipients:
+                await self.command(f'RCPT TO:<{recipient}>', 250, 251)
+            await self.command('DATA', 354)
+        except SMTPResponseException:
+            await self.command('RSET', 250)  # сервер отказал - сбрасываем транзакцию, сессия остаётся рабочей
+            raise
+
+        data = message.message().as_bytes(linesep='\r\n')
+        lines = [b'.' + line if line.startswith(b'.') else line for line in data.split(b'\r\n')]
+        self.writer.write(b'\r\n'.join(lines) + b'\r\n.\r\n')
+        await self.writer.drain()
+        await self.expect(250)
+
+    async def quit(self):
+        try:
+            await self.command('QUIT', 221)
+        except (SMTPException, OSError, asyncio.TimeoutError):
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class RateLimiter:
+    """Пропускает не больше rate отправок в секунду (rate = 0 - без ограничения)"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_time = 0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self.lock:
+            now = asyncio.get_running_loop().time()
+            if self.next_time > now:
+                await asyncio.sleep(self.next_time - now)
+            self.next_time = max(now, self.next_time) + self.interval
+
+
+class AsyncSMTPBackend(BaseEmailBackend):
+    """Почтовый бэкенд на asyncio: держит concurrency SMTP-сессий одновременно,
+    чтобы ожидание ответов сервера шло параллельно, и ограничивает скорость отправки на хост"""
+
+    def __init__(self, host=None, port=None, username=None, password=None, use_tls=None, use_ssl=None,
+                 timeout=None, concurrency=None, rate_limit=None, fail_silently=False, **kwargs):
+        super().__init__(fail_silently=fail_silently)
+        self.host = host or settings.EMAIL_HOST
+        self.port = port or settings.EMAIL_PORT
+        self.username = settings.EMAIL_HOST_USER if username is None else username
+        self.password = settings.EMAIL_HOST_PASSWORD if password is None else password
+        self.use_tls = settings.EMAIL_USE_TLS if use_tls is None else use_tls
+        self.use_ssl = settings.EMAIL_USE_SSL if use_ssl is None else use_ssl
+        self.timeout = settings.EMAIL_TIMEOUT if timeout is None else timeout
+        self.concurrency = concurrency or settings.MAILING_ASYNC_CONCURRENCY
+        self.rate_limit = settings.MAILING_RATE_LIMIT if rate_limit is None else rate_limit
+        self.connections = 0  # сколько SMTP-сессий было открыто
+
+    def send_messages(self, email_messages):
+        errors = self.send_with_errors(email_messages)
+        failed = [err for err in errors if err is not None]
+        if failed and not self.fail_silently:
+            raise failed[0]
+        return len(errors) - len(failed)
+
+    def send_with_errors(self, email_messages):
+        """Отправляет письма, возвращает ошибки в том же порядке (None - письмо ушло)"""
+        if not email_messages:
+            return []
+        return asyncio.run(self.asend_messages(list(email_messages)))
+
+    def new_session(self):
+        return AsyncSMTPSession(self.host, self.port, self.username, self.password,
+                                self.use_ssl, self.use_tls, self.timeout)
+
+    async def asend_messages(self, email_messages):
+        errors = [None] * len(email_messages)
+        indexes = iter(range(len(email_messages)))  # общая очередь писем для всех сессий
+        limiter = RateLimiter(self.rate_limit)
+        connect_error = None  # после первой неудачи подключения остальные сессии к серверу не подключаются
+
+        async def worker():
+            nonlocal connect_error
+            session = None
+            for index in indexes:
+                if connect_error is not None:  # сервер недоступен - оставшиеся письма получают ту же ошибку
+                    errors[index] = connect_error
+                    continue
+                try:
+                    if session is None:
+                        self.connections += 1
+                        session = self.new_session()
+                        try:
+                            await session.connect()
+                        except Exception as err:
+                            session.close()
+                            session = None
+                            connect_error = errors[index] = as_connect_error(err)
+                            continue
+                    await limiter.wait()
+                    await session.send(email_messages[index])
+                except SMTPResponseException as err:  # сервер отказал в этом письме, сессия жива
+                    errors[index] = err
+                except Exception as err:  # сессия сломалась - следующее письмо пойдёт через новую
+                    errors[index] = err
+                    if session is not None:
+                        session.close()
+                    session = None
+            if session is not None:
+                await session.quit()
+
+        await asyncio.gather(*[worker() for _ in range(min(self.concurrency, len(email_messages)))])
+        return errors
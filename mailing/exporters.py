@@ -0,0 +1,47 @@
+import csv
+import json
+
+from django.conf import settings
+
+from mailing.models import Client, MailingList, LogList, LogDaily
+
+# что выгружаем: модель и колонки (поля для values_list)
+EXPORTS = {
+    'clients': (Client, ('id', 'name', 'mail', 'is_active')),
+    'mailing_list': (MailingList, ('mailing_model_id', 'mailing_model__name', 'client_id', 'client__name',
+                                   'client__mail')),
+    'logs': (LogList, ('time', 'mailing_model_id', 'mailing_model__name', 'error_type', 'error_message')),
+    'log_daily': (LogDaily, ('day', 'mailing_model_id', 'mailing_model__name', 'success', 'failure')),
+}
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+class Echo:
+    """Псевдофайл для csv.writer: не накапливает строки, а сразу возвращает их"""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(kind, owner, chunk_size=None):
+    """Потоково читает строки выгрузки пользователя серверным курсором, по chunk_size строк за раз"""
+    model, fields = EXPORTS[kind]
+    queryset = model.objects.filter(owner=owner).order_by('pk').values_list(*fields)
+    return fields, queryset.iterator(chunk_size=chunk_size or settings.MAILING_EXPORT_CHUNK_SIZE)
+
+
+def export_lines(kind, owner, file_format):
+    """Генератор строк файла выгрузки: CSV с заголовком или JSONL (объект на строку)"""
+    fields, rows = export_rows(kind, owner)
+    if file_format == 'jsonl':
+        for row in rows:
+            yield json.dumps(dict(zip(fields, row)), ensure_ascii=False, default=str) + '\n'
+    else:
+        writer = csv.writer(Echo())
+        yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow(row)
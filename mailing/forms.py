@@ -1,7 +1,9 @@
 from django import forms
 from django.forms import BaseFormSet
+from django.template import TemplateSyntaxError
 
 from mailing.models import MailingModel, Client, Message
+from mailing.templating import check_text
 
 
 class StyleFormMixin:
@@ -28,10 +30,27 @@ class ClientForm(StyleFormMixin, forms.ModelForm):
         fields = ('name', 'mail')
 
 
+class ClientImportForm(StyleFormMixin, forms.Form):
+    file = forms.FileField(label='файл с клиентами', help_text='CSV с колонками name, mail или JSONL')
+    file_format = forms.ChoiceField(label='формат', choices=(('', 'по расширению файла'), ('csv', 'CSV'),
+                                                             ('jsonl', 'JSONL')), required=False)
+
+
 class MessageForm(StyleFormMixin, forms.ModelForm):
     class Meta:
         model = Message
         fields = ('name', 'title', 'message')
 
+    def clean(self):
+        cleaned_data = super().clean()
+        for field_name in ('title', 'message'):  # проверяем, что подстановки в письме записаны без ошибок
+            try:
+                check_text(cleaned_data.get(field_name))
+            except TemplateSyntaxError as err:
+                self.add_error(field_name, f'Ошибка в подстановках: {err}')
+            except Exception as err:  # например, {% url %} с несуществующим адресом
+                self.add_error(field_name, f'Подстановки не удалось заполнить: {err}')
+        return cleaned_data
+
 
 
@@ -0,0 +1,96 @@
+import csv
+import io
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.core.validators import validate_email
+
+from mailing.models import Client
+from mailing.stats import change_owner_stats
+
+NAME_MAX_LENGTH = Client._meta.get_field('name').max_length
+MAIL_MAX_LENGTH = Client._meta.get_field('mail').max_length
+
+
+class ClientImportError(ValueError):
+    """Файл не удалось прочитать: неверная кодировка или испорченный CSV"""
+
+
+def detect_format(filename):
+    """Определяет формат файла клиентов по расширению: jsonl или csv"""
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.json', '.ndjson')) else 'csv'
+
+
+def read_rows(file, file_format):
+    """Потоково читает строки файла (бинарного) как словари с полями name и mail"""
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    if file_format == 'jsonl':
+        for line in text:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield {}
+    else:
+        yield from csv.DictReader(text)
+
+
+def to_text(value):
+    """Значение ячейки как строка: в JSONL могут быть числа, null, списки"""
+    return str(value).strip() if isinstance(value, (str, int, float)) else ''
+
+
+def clean_row(row):
+    """Возвращает (имя, email) или None, если email некорректный"""
+    if not isinstance(row, dict):
+        return None
+    mail = to_text(row.get('mail')) or to_text(row.get('email'))
+    name = to_text(row.get('name'))[:NAME_MAX_LENGTH] or mail.split('@')[0][:NAME_MAX_LENGTH]
+    if len(mail) > MAIL_MAX_LENGTH:
+        return None
+    try:
+        validate_email(mail)
+    except ValidationError:
+        return None
+    return name, mail
+
+
+def import_clients(file, owner, file_format='csv', batch_size=None):
+    """Импортирует клиентов пользователя из CSV/JSONL пачками: проверяет email, пропускает уже
+    существующие у пользователя адреса и повторы в файле, добавляет новых через bulk_create.
+    Файл импортируется целиком или не импортируется совсем (ClientImportError, если его не удалось прочитать).
+    Возвращает статистику: создано, дубликатов, некорректных строк"""
+    try:
+        with transaction.atomic():
+            stats = import_rows(read_rows(file, file_format), owner, batch_size or settings.MAILING_IMPORT_BATCH_SIZE)
+    except UnicodeDecodeError:
+        raise ClientImportError('Файл должен быть в кодировке UTF-8')
+    except csv.Error as err:
+        raise ClientImportError(f'Не удалось прочитать CSV: {err}')
+    change_owner_stats(owner.pk, client_amount=stats['created'])  # bulk_create не вызывает сигналы
+    return stats
+
+
+def import_rows(rows, owner, batch_size):
+    stats = {'created': 0, 'duplicates': 0, 'invalid': 0}
+    while batch := list(islice(rows, batch_size)):
+        clients = {}
+        for row in batch:
+            cleaned = clean_row(row)
+            if cleaned is None:
+                stats['invalid'] += 1
+            elif cleaned[1] in clients:
+                stats['duplicates'] += 1
+            else:
+                clients[cleaned[1]] = cleaned[0]
+
+        existing = set(Client.objects.filter(owner=owner, mail__in=clients.keys()).values_list('mail', flat=True))
+        stats['duplicates'] += len(existing)
+        Client.objects.bulk_create(
+            [Client(name=name, mail=mail, owner=owner) for mail, name in clients.items() if mail not in existing]
+        )
+        stats['created'] += len(clients) - len(existing)
+    return stats
@@ -0,0 +1,114 @@
+import statistics
+import time
+from datetime import datetime, time as dt_time, timedelta
+
+from django.core import mail
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from mailing.models import Client, MailingModel, Message, MailingList, LogList, Outbox
+from mailing.services import check_adn_run_mailings, invalidate_schedule
+from users.models import User
+
+BENCH_EMAIL = 'bench@bench.local'
+
+
+class Command(BaseCommand):
+    """Замеряет время тика рассылок на синтетических данных, письма уходят в локальный ящик (locmem).
+    Тик планировщика общий для всех рассылок, поэтому бенчмарк отказывается запускаться, пока в базе
+    есть чужие наступившие рассылки или неотправленные письма: иначе они ушли бы в locmem вместо адресатов"""
+    help = 'Бенчмарк отправки рассылок: python manage.py bench_mailing --mailings 100 --recipients 1000'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mailings', type=int, default=10, help='сколько рассылок создать')
+        parser.add_argument('--recipients', type=int, default=100, help='сколько клиентов в каждой рассылке')
+        parser.add_argument('--ticks', type=int, default=5, help='сколько тиков планировщика замерить')
+        parser.add_argument('--keep', action='store_true', help='не удалять тестовые данные после замера')
+
+    def handle(self, *args, **options):
+        self.check_idle(User.objects.filter(email=BENCH_EMAIL).first())
+        owner = self.seed(options['mailings'], options['recipients'])
+        try:
+            latencies, queries, sent = self.run_ticks(owner, options['ticks'])
+        finally:
+            if not options['keep']:
+                self.cleanup(owner)
+
+        total_time = sum(latencies)
+        latencies.sort()
+        self.stdout.write(f'рассылок: {options["mailings"]}, получателей в рассылке: {options["recipients"]}, '
+                          f'тиков: {options["ticks"]}')
+        self.stdout.write(f'писем отправлено: {sent}, писем/сек: {sent / total_time:.1f}')
+        self.stdout.write(f'запросов к БД за тик: {statistics.mean(queries):.1f}')
+        self.stdout.write(f'время тика p50: {self.percentile(latencies, 50) * 1000:.1f} мс, '
+                          f'p99: {self.percentile(latencies, 99) * 1000:.1f} мс')
+
+    @staticmethod
+    def percentile(values, percent):
+        index = min(len(values) - 1, round(percent / 100 * (len(values) - 1)))
+        return values[index]
+
+    def seed(self, mailings_amount, recipients_amount):
+        """Создаёт пользователя, клиентов, письмо и рассылки, в которые входят все клиенты"""
+        self.cleanup(User.objects.filter(email=BENCH_EMAIL).first())
+        owner = User.objects.create(email=BENCH_EMAIL)
+        message = Message.objects.create(name='bench', title='bench', message='bench message', owner=owner)
+        clients = Client.objects.bulk_create(
+            [Client(name=f'client {i}', mail=f'client{i}@bench.local', owner=owner) for i in range(recipients_amount)]
+        )
+        mailings = MailingModel.objects.bulk_create([
+            MailingModel(name=f'bench {i}', time_from=dt_time.min, time_to=dt_time.max, message=message,
+                         is_active=True, owner=owner)
+            for i in range(mailings_amount)
+        ])
+        for mailing in mailings:
+            MailingList.objects.bulk_create(
+                [MailingList(mailing_model=mailing, client=client, owner=owner) for client in clients],
+                batch_size=1000
+            )
+        return owner
+
+    @staticmethod
+    def check_idle(owner):
+        """Проверяет, что тик не заберёт чужие рассылки и письма"""
+        others_due = MailingModel.objects.filter(is_active=True, next_run_at__lte=datetime.now())
+        others_queued = Outbox.objects.filter(status__in=Outbox.STATUSES_UNFINISHED)
+        if owner is not None:
+            others_due = others_due.exclude(owner=owner)
+            others_queued = others_queued.exclude(owner=owner)
+        if others_due.exists() or others_queued.exists():
+            raise CommandError('Есть наступившие рассылки или неотправленные письма пользователей, '
+                               'запустите бенчмарк, когда очередь пуста (или на отдельной базе)')
+
+    def run_ticks(self, owner, ticks):
+        latencies, queries, sent = [], [], 0
+        # только локальный ящик: без asyncio-бэкенда (он подключается к SMTP напрямую), релеев и лимитов скорости
+        with override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', MAILING_USE_CELERY=False,
+                               MAILING_ASYNC_DELIVERY=False, MAILING_SMTP_RELAYS=[], MAILING_SMTP_RATE=0,
+                               MAILING_OWNER_RATE=0, MAILING_RATE_LIMIT=0):
+            for _ in range(ticks):
+                self.check_idle(owner)
+                # делаем все тестовые рассылки снова наступившими
+                MailingModel.objects.filter(owner=owner).update(next_run_at=datetime.now() - timedelta(seconds=1))
+                invalidate_schedule()
+                mail.outbox = []
+
+                with CaptureQueriesContext(connection) as context:
+                    start = time.perf_counter()
+                    check_adn_run_mailings()
+                    latencies.append(time.perf_counter() - start)
+                queries.append(len(context.captured_queries))
+                sent += len(mail.outbox)
+        return latencies, queries, sent
+
+    def cleanup(self, owner):
+        """Удаляет все тестовые данные бенчмарка"""
+        if owner is None:
+            return
+        LogList.objects.filter(mailing_model__owner=owner).delete()
+        MailingList.objects.filter(owner=owner).delete()
+        MailingModel.objects.filter(owner=owner).delete()
+        Client.objects.filter(owner=owner).delete()
+        Message.objects.filter(owner=owner).delete()
+        owner.delete()
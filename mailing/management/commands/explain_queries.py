@@ -0,0 +1,61 @@
+import re
+from datetime import datetime
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+
+from mailing.models import Client, MailingModel, Message, LogList, Outbox
+from users.models import User
+
+# последовательное чтение всей таблицы в плане: PostgreSQL - "Seq Scan on", SQLite - "SCAN <таблица>" без индекса
+SEQ_SCAN_RE = re.compile(r'Seq Scan on (\w+)|\bSCAN (\w+)(?! USING)(?:\s*$)', re.MULTILINE)
+
+
+def hot_queries(owner_id, mailing_id):
+    """Самые частые запросы: списки на страницах пользователя, журнал рассылки, выбор рассылок и очереди писем"""
+    now = datetime.now()
+    return {
+        'mailing_list': MailingModel.objects.filter(owner=owner_id)[:10],
+        'messages_list': Message.objects.filter(owner=owner_id)[:10],
+        'clients_list': Client.objects.filter(owner=owner_id)[:10],
+        'loglist_list': LogList.objects.filter(owner=owner_id).order_by('-time', '-id')[:10],
+        'loglist_by_mailing': LogList.objects.filter(mailing_model=mailing_id)[:10],
+        'due_mailings': MailingModel.objects.filter(is_active=True, next_run_at__lte=now, message__isnull=False).order_by(),
+        'outbox_pending': Outbox.objects.filter(status__in=Outbox.STATUSES_UNFINISHED, next_attempt_at__lte=now)[:500],
+    }
+
+
+class Command(BaseCommand):
+    """Выполняет EXPLAIN для частых запросов и показывает те, что читают таблицу целиком (без индекса)"""
+    help = 'Проверка планов запросов: python manage.py explain_queries [--owner user@example.com] [--strict]'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--owner', help='email пользователя, для которого строить запросы')
+        parser.add_argument('--analyze', action='store_true', help='EXPLAIN ANALYZE (только PostgreSQL)')
+        parser.add_argument('--verbose-plans', action='store_true', help='печатать планы целиком')
+        parser.add_argument('--strict', action='store_true', help='завершиться с ошибкой, если найдены полные чтения')
+
+    def handle(self, *args, **options):
+        owner = User.objects.filter(email=options['owner']).first() if options['owner'] else \
+            User.objects.filter(client__isnull=False).first()
+        owner_id = owner.pk if owner else 0
+        mailing_id = MailingModel.objects.filter(owner=owner_id).values_list('pk', flat=True).first() or 0
+        explain_options = {'analyze': True} if options['analyze'] and connection.vendor == 'postgresql' else {}
+
+        flagged = []
+        for name, queryset in hot_queries(owner_id, mailing_id).items():
+            plan = queryset.explain(**explain_options)
+            tables = sorted({table for match in SEQ_SCAN_RE.findall(plan) for table in match if table})
+            if tables:
+                flagged.append(name)
+                self.stdout.write(self.style.WARNING(f'{name}: полное чтение таблиц {", ".join(tables)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: ok'))
+            if options['verbose_plans'] or tables:
+                self.stdout.write(plan)
+
+        if flagged and options['strict']:
+            raise CommandError(f'Запросы без индекса: {", ".join(flagged)}')
+        if flagged:
+            self.stdout.write('На маленьких таблицах планировщик может выбрать полное чтение и при наличии индекса, '
+                              'проверяйте на данных, близких к боевым (после ANALYZE)')
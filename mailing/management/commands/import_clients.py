@@ -0,0 +1,28 @@
+from django.core.management import BaseCommand, CommandError
+
+from mailing.importers import ClientImportError, detect_format, import_clients
+from users.models import User
+
+
+class Command(BaseCommand):
+    """Импорт клиентов пользователя из CSV (колонки name, mail) или JSONL ({"name": ..., "mail": ...})"""
+    help = 'Импорт клиентов: python manage.py import_clients clients.csv --owner user@example.com'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='путь к файлу CSV или JSONL')
+        parser.add_argument('--owner', required=True, help='email пользователя, которому добавить клиентов')
+        parser.add_argument('--format', choices=('csv', 'jsonl'), help='формат файла (по умолчанию по расширению)')
+
+    def handle(self, *args, **options):
+        try:
+            owner = User.objects.get(email=options['owner'])
+        except User.DoesNotExist:
+            raise CommandError(f'Пользователь {options["owner"]} не найден')
+
+        with open(options['path'], 'rb') as file:
+            try:
+                stats = import_clients(file, owner, options['format'] or detect_format(options['path']))
+            except ClientImportError as err:
+                raise CommandError(str(err))
+        self.stdout.write(f'создано: {stats["created"]}, дубликатов: {stats["duplicates"]}, '
+                          f'некорректных строк: {stats["invalid"]}')
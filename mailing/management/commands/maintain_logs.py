@@ -0,0 +1,8 @@
+from django.core.management import BaseCommand
+from mailing.retention import maintain_logs
+
+
+class Command(BaseCommand):
+
+    def handle(self, *args, **options):
+        maintain_logs()
@@ -0,0 +1,56 @@
+from django.db import connection
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Q
+
+from mailing.models import Client, MailingList
+
+
+def select_clients(owner, client_ids=None, query=None):
+    """Клиенты пользователя для массового добавления/удаления: все, по списку id или по поиску в имени и email"""
+    clients = Client.objects.filter(owner=owner)
+    if client_ids is not None:
+        clients = clients.filter(pk__in=client_ids)
+    if query:
+        clients = clients.filter(Q(name__icontains=query) | Q(mail__icontains=query))
+    return clients.order_by().values('pk')
+
+
+def add_clients(mailing, clients):
+    """Добавляет клиентов в рассылку одним запросом INSERT ... SELECT, уже добавленные пропускает.
+    Клиенты не загружаются в Python, сколько бы их ни было. Возвращает число добавленных"""
+    select_sql, params = clients.query.sql_with_params()
+    table = MailingList._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql = (f'INSERT INTO {table} (mailing_model_id, client_id, owner_id) '
+               f'SELECT %s, clients.id, %s FROM ({select_sql}) AS clients ON CONFLICT DO NOTHING')
+    else:
+        sql = (f'INSERT OR IGNORE INTO {table} (mailing_model_id, client_id, owner_id) '
+               f'SELECT %s, clients.id, %s FROM ({select_sql}) AS clients')
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (mailing.pk, mailing.owner_id, *params))
+        return cursor.rowcount
+
+
+def remove_clients(mailing, clients):
+    """Удаляет клиентов из рассылки одним запросом DELETE ... WHERE. Возвращает число удалённых"""
+    select_sql, params = clients.query.sql_with_params()
+    table = MailingList._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE mailing_model_id = %s AND client_id IN ({select_sql})',
+                       (mailing.pk, *params))
+        return cursor.rowcount
+
+
+def mailing_clients_page(mailing, in_list, query=None, after=None, limit=None):
+    """Страница клиентов рассылки (in_list=True) или не добавленных в неё (anti-join NOT EXISTS).
+    Листание по ключу: клиенты с id больше after, без OFFSET и COUNT. Возвращает (клиенты, after следующей страницы)"""
+    limit = limit or settings.MAILING_EDITOR_PAGE_SIZE
+    members = MailingList.objects.filter(mailing_model=mailing.pk, client=OuterRef('pk'))
+    clients = Client.objects.filter(owner=mailing.owner_id)
+    clients = clients.filter(Exists(members)) if in_list else clients.filter(~Exists(members))
+    if query:
+        clients = clients.filter(Q(name__icontains=query) | Q(mail__icontains=query))
+    if after:
+        clients = clients.filter(pk__gt=after)
+    page = list(clients.order_by('pk')[:limit + 1])
+    return page[:limit], page[limit - 1].pk if len(page) > limit else None
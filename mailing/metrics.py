@@ -0,0 +1,104 @@
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import F
+
+from mailing.models import MetricCounter
+
+logger = logging.getLogger('mailing')
+
+# имена строк MetricCounter: счётчики накапливаются, время последнего тика перезаписывается
+TICKS = 'ticks'
+TIMING_PREFIX = 'timing:'
+COUNTER_PREFIX = 'counter:'
+LAST_TICK_PREFIX = 'last_tick:'
+
+
+class TickMetrics:
+    """Собирает время фаз и счётчики одного тика планировщика рассылок"""
+
+    def __init__(self):
+        self.timings = defaultdict(float)  # секунды по фазам
+        self.counters = defaultdict(int)
+        self.lock = threading.Lock()  # счётчики обновляются и из потоков отправки
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        """Замеряет время фазы тика, одна и та же фаза может встречаться несколько раз"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        with self.lock:
+            self.timings[name] += seconds
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def report(self):
+        """Пишет итог тика строкой лога в JSON и добавляет его к накопленным метрикам в БД"""
+        self.timings['total'] = time.perf_counter() - self.started
+        logger.info('mailing tick %s', json.dumps({
+            'timings': {name: round(value, 4) for name, value in self.timings.items()},
+            'counters': dict(self.counters),
+        }, sort_keys=True))
+
+        counters = {TICKS: 1}
+        counters.update({TIMING_PREFIX + name: value for name, value in self.timings.items()})
+        counters.update({COUNTER_PREFIX + name: value for name, value in self.counters.items()})
+        last_tick = [MetricCounter(name=LAST_TICK_PREFIX + name, value=value) for name, value in self.timings.items()]
+        with transaction.atomic():
+            add_metric_counters(counters)
+            MetricCounter.objects.filter(name__startswith=LAST_TICK_PREFIX).exclude(
+                name__in=[counter.name for counter in last_tick]
+            ).delete()
+            MetricCounter.objects.bulk_create(last_tick, update_conflicts=True, unique_fields=['name'],
+                                              update_fields=['value'])
+
+
+def add_metric_counters(values):
+    """Атомарно прибавляет значения к счётчикам в БД: параллельные тики не затирают приращения друг друга"""
+    MetricCounter.objects.bulk_create([MetricCounter(name=name) for name in values], ignore_conflicts=True)
+    for name, value in values.items():
+        MetricCounter.objects.filter(name=name).update(value=F('value') + value)
+
+
+def render_prometheus():
+    """Отдаёт накопленные метрики планировщика в текстовом формате Prometheus"""
+    totals = {'ticks': 0, 'timings': {}, 'counters': {}, 'last_tick': {}}
+    prefixes = {TIMING_PREFIX: 'timings', COUNTER_PREFIX: 'counters', LAST_TICK_PREFIX: 'last_tick'}
+    for name, value in MetricCounter.objects.values_list('name', 'value'):
+        if name == TICKS:
+            totals['ticks'] = int(value)
+            continue
+        for prefix, group in prefixes.items():
+            if name.startswith(prefix):
+                totals[group][name[len(prefix):]] = value
+    lines = [
+        '# HELP mailing_ticks_total Количество тиков планировщика рассылок',
+        '# TYPE mailing_ticks_total counter',
+        f'mailing_ticks_total {totals["ticks"]}',
+        '# HELP mailing_phase_seconds_total Суммарное время фаз тика',
+        '# TYPE mailing_phase_seconds_total counter',
+    ]
+    lines += [f'mailing_phase_seconds_total{{phase="{name}"}} {value:.6f}'
+              for name, value in sorted(totals['timings'].items())]
+    lines += [
+        '# HELP mailing_last_tick_phase_seconds Время фаз последнего тика',
+        '# TYPE mailing_last_tick_phase_seconds gauge',
+    ]
+    lines += [f'mailing_last_tick_phase_seconds{{phase="{name}"}} {value:.6f}'
+              for name, value in sorted(totals['last_tick'].items())]
+    for name, value in sorted(totals['counters'].items()):
+        lines += [f'# TYPE mailing_{name}_total counter', f'mailing_{name}_total {value:g}']
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:02
+
+from datetime import datetime, timedelta
+
+from django.db import migrations, models
+
+
+def next_window_start(time_from, time_to, week_day, moment):
+    """Копия mailing.models.next_window_start на момент миграции"""
+    if time_from > time_to:
+        return None
+    for days in range(8):
+        day = moment.date() + timedelta(days=days)
+        if week_day and day.isoweekday() != int(week_day):
+            continue
+        if datetime.combine(day, time_to) >= moment:
+            return datetime.combine(day, time_from)
+    return None
+
+
+def fill_next_run_at(apps, schema_editor):
+    """Заполняет next_run_at у существующих рассылок"""
+    MailingModel = apps.get_model('mailing', 'MailingModel')
+    now = datetime.now()
+    for mailing in MailingModel.objects.all():
+        next_run = next_window_start(mailing.time_from, mailing.time_to, mailing.week_day, now)
+        if mailing.sent and next_run is not None and next_run <= now:  # в текущем окне уже отправляли
+            next_run = next_window_start(mailing.time_from, mailing.time_to, mailing.week_day,
+                                         datetime.combine(next_run.date(), mailing.time_to) + timedelta(microseconds=1))
+        mailing.next_run_at = next_run
+        mailing.save(update_fields=['next_run_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0018_client_owner_loglist_owner_mailinglist_owner_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mailingmodel',
+            name='next_run_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='следующий запуск'),
+        ),
+        migrations.AddIndex(
+            model_name='mailingmodel',
+            index=models.Index(fields=['is_active', 'next_run_at'], name='mailing_due_idx'),
+        ),
+        migrations.RunPython(fill_next_run_at, migrations.RunPython.noop),
+    ]
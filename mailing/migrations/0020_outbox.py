@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('mailing', '0019_mailingmodel_next_run_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Outbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_at', models.DateTimeField(verbose_name='запуск рассылки')),
+                ('mail', models.EmailField(max_length=50, verbose_name='email получателя')),
+                ('status', models.CharField(choices=[('pending', 'ожидает отправки'), ('sent', 'отправлено'), ('failed', 'ошибка')], default='pending', max_length=10, verbose_name='статус')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='попыток отправки')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='следующая попытка')),
+                ('error_message', models.TextField(blank=True, verbose_name='последняя ошибка')),
+                ('mailing_model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mailing.mailingmodel', verbose_name='рассылка')),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='пользователь')),
+            ],
+            options={
+                'verbose_name': 'исходящее письмо',
+                'verbose_name_plural': 'исходящие письма',
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='outbox_pending_idx'), models.Index(fields=['mailing_model', 'run_at', 'status'], name='outbox_run_status_idx')],
+                'unique_together': {('mailing_model', 'run_at', 'mail')},
+            },
+        ),
+    ]
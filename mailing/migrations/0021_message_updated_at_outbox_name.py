@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0020_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='изменено'),
+        ),
+        migrations.AddField(
+            model_name='outbox',
+            name='name',
+            field=models.CharField(blank=True, max_length=50, verbose_name='имя получателя'),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='message',
+            field=models.TextField(help_text='можно подставлять данные клиента: {{ name }} - имя, {{ mail }} - email', verbose_name='сообщение'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0021_message_updated_at_outbox_name'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['owner', 'name'], name='client_owner_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loglist',
+            index=models.Index(fields=['owner', '-time', '-id'], name='loglist_owner_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loglist',
+            index=models.Index(fields=['mailing_model', '-time'], name='loglist_mailing_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mailingmodel',
+            index=models.Index(fields=['owner', 'time_from'], name='mailing_owner_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['owner', 'name'], name='message_owner_name_idx'),
+        ),
+    ]
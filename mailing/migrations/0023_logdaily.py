@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('mailing', '0022_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='день')),
+                ('success', models.PositiveIntegerField(default=0, verbose_name='успешно')),
+                ('failure', models.PositiveIntegerField(default=0, verbose_name='с ошибками')),
+                ('mailing_model', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='mailing.mailingmodel', verbose_name='рассылка')),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='пользователь')),
+            ],
+            options={
+                'verbose_name': 'итог журнала за день',
+                'verbose_name_plural': 'итоги журнала по дням',
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['owner', '-day'], name='logdaily_owner_day_idx'), models.Index(fields=['day'], name='logdaily_day_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,77 @@
+from datetime import date, datetime
+
+from django.conf import settings
+from django.db import migrations
+
+TABLE = 'mailing_loglist'
+PARTITION_PREFIX = f'{TABLE}_p'  # копия mailing.retention на момент миграции
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+
+def month_start(day, months=0):
+    """Первое число месяца, сдвинутого на months от месяца дня day"""
+    month = day.year * 12 + day.month - 1 + months
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def create_log_partition(cursor, month):
+    """Создаёт раздел журнала за месяц, если его ещё нет"""
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {PARTITION_PREFIX}{month:%Y%m} PARTITION OF {TABLE} '
+        f'FOR VALUES FROM (%s) TO (%s)', [str(month), str(month_start(month, 1))]
+    )
+
+
+def partition_loglist(apps, schema_editor):
+    """Переводит журнал рассылок на PostgreSQL в таблицу, разбитую по месяцам (PARTITION BY RANGE (time)).
+    Первичный ключ раздела обязан включать ключ разбиения, поэтому он становится (id, time),
+    id по-прежнему выдаёт последовательность. На других СУБД журнал остаётся обычной таблицей"""
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    MailingModel = apps.get_model('mailing', 'MailingModel')
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_old')
+        cursor.execute(f'ALTER INDEX {TABLE}_pkey RENAME TO {TABLE}_old_pkey')
+        cursor.execute(f'CREATE SEQUENCE {TABLE}_part_id_seq')
+        cursor.execute(f"SELECT setval('{TABLE}_part_id_seq', COALESCE((SELECT max(id) FROM {TABLE}_old), 0) + 1, false)")
+        cursor.execute(f'CREATE TABLE {TABLE} (LIKE {TABLE}_old) PARTITION BY RANGE ("time")')
+        cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_part_id_seq')")
+        cursor.execute(f'ALTER SEQUENCE {TABLE}_part_id_seq OWNED BY {TABLE}.id')
+        cursor.execute(f'ALTER TABLE {TABLE} ADD PRIMARY KEY (id, "time")')
+
+        # разделы на все месяцы, за которые уже есть записи, и на ближайшие месяцы вперёд
+        cursor.execute(f'SELECT min("time") FROM {TABLE}_old')
+        first_time = cursor.fetchone()[0]
+        today = datetime.now().date()
+        month = month_start(first_time.date() if first_time else today)
+        while month <= month_start(today, 2):
+            create_log_partition(cursor, month)
+            month = month_start(month, 1)
+        cursor.execute(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT')
+
+        cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {TABLE}_old')
+        cursor.execute(f'DROP TABLE {TABLE}_old')
+
+        # индексы из 0022 создаются на родительской таблице и наследуются всеми разделами
+        cursor.execute(f'CREATE INDEX loglist_owner_time_idx ON {TABLE} (owner_id, "time" DESC, id DESC)')
+        cursor.execute(f'CREATE INDEX loglist_mailing_time_idx ON {TABLE} (mailing_model_id, "time" DESC)')
+        cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_mailing_model_id_fk FOREIGN KEY (mailing_model_id) '
+                       f'REFERENCES {MailingModel._meta.db_table} (id) DEFERRABLE INITIALLY DEFERRED')
+        cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_owner_id_fk FOREIGN KEY (owner_id) '
+                       f'REFERENCES {User._meta.db_table} (id) DEFERRABLE INITIALLY DEFERRED')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('mailing', '0023_logdaily'),
+    ]
+
+    operations = [
+        # обратно в обычную таблицу не переводим: разбитый журнал работает и со старым кодом
+        migrations.RunPython(partition_loglist, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('mailing', '0024_partition_loglist'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OwnerStats',
+            fields=[
+                ('owner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='пользователь')),
+                ('mailing_amount', models.IntegerField(default=0, verbose_name='всего рассылок')),
+                ('active_mailing_amount', models.IntegerField(default=0, verbose_name='активных рассылок')),
+                ('client_amount', models.IntegerField(default=0, verbose_name='клиентов в базе')),
+                ('reconciled_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='последняя сверка')),
+            ],
+            options={
+                'verbose_name': 'статистика пользователя',
+                'verbose_name_plural': 'статистика пользователей',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0025_ownerstats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outbox',
+            name='status',
+            field=models.CharField(choices=[('pending', 'ожидает отправки'), ('sending', 'отправляется'), ('sent', 'отправлено'), ('failed', 'ошибка')], default='pending', max_length=10, verbose_name='статус'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_unfinished_runs(apps, schema_editor):
+    """Запуски, письма которых ещё в очереди: их итог запишет write_run_summaries.
+    Итоги завершённых запусков уже записаны в журнал при отправке"""
+    Outbox = apps.get_model('mailing', 'Outbox')
+    MailingRun = apps.get_model('mailing', 'MailingRun')
+    runs = Outbox.objects.filter(status__in=['pending', 'sending']).order_by().values_list(
+        'mailing_model_id', 'run_at'
+    ).distinct()
+    MailingRun.objects.bulk_create(
+        [MailingRun(mailing_model_id=mailing_id, run_at=run_at) for mailing_id, run_at in runs],
+        batch_size=500, ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0026_outbox_sending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailingRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_at', models.DateTimeField(verbose_name='запуск рассылки')),
+                ('summarized', models.BooleanField(default=False, verbose_name='итог записан')),
+                ('mailing_model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mailing.mailingmodel', verbose_name='рассылка')),
+            ],
+            options={
+                'verbose_name': 'запуск рассылки',
+                'verbose_name_plural': 'запуски рассылок',
+                'indexes': [models.Index(fields=['summarized', 'run_at'], name='mailingrun_summarized_idx')],
+                'unique_together': {('mailing_model', 'run_at')},
+            },
+        ),
+        migrations.RunPython(create_unfinished_runs, migrations.RunPython.noop),
+    ]
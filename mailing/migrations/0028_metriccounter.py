@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0027_mailingrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricCounter',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='метрика')),
+                ('value', models.FloatField(default=0, verbose_name='значение')),
+            ],
+            options={
+                'verbose_name': 'метрика',
+                'verbose_name_plural': 'метрики',
+            },
+        ),
+    ]
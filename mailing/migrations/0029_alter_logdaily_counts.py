@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0028_metriccounter'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='logdaily',
+            name='failure',
+            field=models.PositiveIntegerField(default=0, verbose_name='запусков доставлено не всем'),
+        ),
+        migrations.AlterField(
+            model_name='logdaily',
+            name='success',
+            field=models.PositiveIntegerField(default=0, verbose_name='запусков доставлено всем'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0029_alter_logdaily_counts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='outbox',
+            index=models.Index(fields=['owner', 'status', 'next_attempt_at'], name='outbox_owner_ready_idx'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.core.mail.message import forbid_multi_line_headers, make_msgid, DNS_NAME
+from email.utils import formatdate
+
+# заголовки, которые у каждого получателя свои, остальное письмо кодируется один раз
+PER_RECIPIENT_HEADERS = ('From', 'To', 'Date', 'Message-ID')
+
+SHARED_CACHE_SIZE = 64
+_shared = OrderedDict()  # (id письма, время изменения) -> SharedBody
+
+
+class SharedBody:
+    """Закодированные один раз тема, заголовки содержимого и тело письма, общие для всех получателей"""
+
+    def __init__(self, subject, body):
+        self.subject = subject
+        self.body = body
+        template = EmailMessage(subject, body).message()
+        for name in PER_RECIPIENT_HEADERS:
+            del template[name]
+        self.headers, self.payload = template.as_bytes(linesep='\r\n').split(b'\r\n\r\n', 1)
+
+
+class PrecomputedMessage:
+    """MIME-сообщение из готового тела и заголовков конкретного получателя, для SMTP-бэкендов"""
+
+    def __init__(self, head, shared):
+        self.head = head
+        self.shared = shared
+
+    def as_bytes(self, unixfrom=False, linesep='\n'):
+        data = self.head + self.shared.headers + b'\r\n\r\n' + self.shared.payload
+        return data if linesep == '\r\n' else data.replace(b'\r\n', linesep.encode())
+
+    def as_string(self, unixfrom=False, linesep='\n'):
+        return self.as_bytes(linesep=linesep).decode('ascii', errors='replace')
+
+
+class SharedBodyEmailMessage(EmailMessage):
+    """Письмо, которое не собирает MIME заново: к общему телу добавляются только заголовки получателя"""
+
+    def __init__(self, shared, from_email=None, to=None, bcc=None):
+        super().__init__(shared.subject, shared.body, from_email, to, bcc=bcc)
+        self.shared = shared
+
+    def message(self):
+        encoding = self.encoding or settings.DEFAULT_CHARSET
+        headers = [('From', self.from_email)]
+        if self.to:
+            headers.append(('To', ', '.join(str(address) for address in self.to)))
+        headers.append(('Date', formatdate(localtime=settings.EMAIL_USE_LOCALTIME)))
+        headers.append(('Message-ID', make_msgid(domain=DNS_NAME)))
+        head = b''.join(
+            '{}: {}\r\n'.format(*forbid_multi_line_headers(name, value, encoding)).encode('ascii')
+            for name, value in headers
+        )
+        return PrecomputedMessage(head, self.shared)
+
+
+def get_shared_body(message):
+    """Возвращает общее тело письма рассылки, кодирует его один раз на версию письма"""
+    key = (message.pk, message.updated_at)
+    shared = _shared.get(key)
+    if shared is None:
+        shared = SharedBody(message.title or '', message.message)
+        _shared[key] = shared
+        if len(_shared) > SHARED_CACHE_SIZE:
+            _shared.popitem(last=False)
+    else:
+        _shared.move_to_end(key)
+    return shared
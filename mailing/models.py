@@ -1,3 +1,5 @@
+from datetime import datetime, timedelta
+
 from django.db import models
 from django.utils import timezone
 
@@ -5,6 +7,19 @@ from conf import settings
 
 NULLABLE = {'blank': True, 'null': True}
 
+
+def next_window_start(time_from, time_to, week_day, moment):
+    """Возвращает начало ближайшего окна рассылки, которое ещё не закончилось к моменту moment"""
+    if time_from > time_to:  # окно через полночь никогда не срабатывало, сохраняем это поведение
+        return None
+    for days in range(8):
+        day = moment.date() + timedelta(days=days)
+        if week_day and day.isoweekday() != int(week_day):
+            continue
+        if datetime.combine(day, time_to) >= moment:
+            return datetime.combine(day, time_from)
+    return None
+
 class Client(models.Model): # хранит имя клиента рассылки и его почту
     name = models.CharField(max_length=50, verbose_name='имя клиента')
     mail = models.EmailField(max_length=50, verbose_name='email клиента')
@@ -19,12 +34,17 @@ class Client(models.Model): # хранит имя клиента рассылк
         verbose_name = 'клиент'
         verbose_name_plural = 'клиенты'
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['owner', 'name'], name='client_owner_name_idx'),
+        ]
 
 
 class Message(models.Model): # хранит шаблон письма
     name = models.CharField(max_length=30, verbose_name='название')
     title = models.CharField(max_length=200, **NULLABLE, verbose_name='тема письма')
-    message = models.TextField(verbose_name='сообщение')
+    message = models.TextField(verbose_name='сообщение',
+                               help_text='можно подставлять данные клиента: {{ name }} - имя, {{ mail }} - email')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='изменено')
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, **NULLABLE,
                               verbose_name='пользователь')
 
@@ -36,6 +56,9 @@ class Message(models.Model): # хранит шаблон письма
         verbose_name = 'сообщение'
         verbose_name_plural = 'сообщения'
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['owner', 'name'], name='message_owner_name_idx'),
+        ]
 
 
 class MailingModel(models.Model): # хранит рассылку
@@ -56,16 +79,45 @@ class MailingModel(models.Model): # хранит рассылку
     message = models.ForeignKey(Message, on_delete=models.SET_NULL, **NULLABLE, verbose_name='текст рассылки')
     sent = models.BooleanField(default=False, verbose_name='рассылка проведена')
     is_active = models.BooleanField(default=False, verbose_name='активна')
+    next_run_at = models.DateTimeField(**NULLABLE, verbose_name='следующий запуск')
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, **NULLABLE,
                               verbose_name='пользователь')
 
     def __str__(self):
         return f'{self.name}: weekday - {self.week_day}, time {self.time_from} - {self.time_to}'
 
+    def window_end(self):
+        """Возвращает окончание окна рассылки, которое начинается в next_run_at"""
+        return datetime.combine(self.next_run_at.date(), self.time_to)
+
+    def schedule_next_run(self, moment=None):
+        """Вычисляет next_run_at - начало ближайшего окна рассылки, в котором она ещё не проводилась"""
+        moment = moment or datetime.now()
+        # время может быть задано строкой, например MailingModel.objects.create(time_from='10:00', ...)
+        for field in ('time_from', 'time_to'):
+            setattr(self, field, self._meta.get_field(field).to_python(getattr(self, field)))
+        next_run = next_window_start(self.time_from, self.time_to, self.week_day, moment)
+        # если в текущем окне рассылка уже проводилась, планируем её на следующее окно
+        if next_run is not None and next_run <= moment and \
+                self.next_run_at is not None and self.next_run_at > moment:
+            next_run = next_window_start(self.time_from, self.time_to, self.week_day,
+                                         datetime.combine(next_run.date(), self.time_to) + timedelta(microseconds=1))
+        self.next_run_at = next_run
+
+    def save(self, *args, **kwargs):
+        # при полном сохранении (создание, редактирование, вкл/откл) пересчитываем расписание
+        if kwargs.get('update_fields') is None:
+            self.schedule_next_run()
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = 'рассылка'
         verbose_name_plural = 'рассылки'
         ordering = ['time_from']
+        indexes = [
+            models.Index(fields=['is_active', 'next_run_at'], name='mailing_due_idx'),
+            models.Index(fields=['owner', 'time_from'], name='mailing_owner_time_idx'),
+        ]
 
 
 class MailingList(models.Model): # хранит список рассылка-клиент
@@ -84,6 +136,8 @@ class MailingList(models.Model): # хранит список рассылка-к
 
 
 class LogList(models.Model): # лог ошибок и успехов при отправке почты
+    SUCCESS = 'successful!'  # error_type итога запуска, доставленного всем получателям
+    PARTIAL = 'partially successful'  # error_type итога запуска, доставленного не всем
     mailing_model = models.ForeignKey(MailingModel, on_delete=models.CASCADE, **NULLABLE, verbose_name='рассылка')
     time = models.DateTimeField(default=timezone.now, verbose_name='время рассылки')
     error_type = models.CharField(max_length=50, verbose_name='успех / тип ошибки')
@@ -95,3 +149,110 @@ class LogList(models.Model): # лог ошибок и успехов при от
         verbose_name = 'лог рассылки'
         verbose_name_plural = 'логи рассылки'
         ordering = ['-time']
+        indexes = [
+            models.Index(fields=['owner', '-time', '-id'], name='loglist_owner_time_idx'),
+            models.Index(fields=['mailing_model', '-time'], name='loglist_mailing_time_idx'),
+        ]
+
+
+class LogDaily(models.Model): # итоги журнала рассылок за день: сколько запусков рассылки прошло успешно и частично
+    day = models.DateField(verbose_name='день')
+    mailing_model = models.ForeignKey(MailingModel, on_delete=models.SET_NULL, **NULLABLE, verbose_name='рассылка')
+    success = models.PositiveIntegerField(default=0, verbose_name='запусков доставлено всем')
+    failure = models.PositiveIntegerField(default=0, verbose_name='запусков доставлено не всем')
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, **NULLABLE,
+                              verbose_name='пользователь')
+
+    def __str__(self):
+        return f'{self.day} {self.mailing_model_id}: {self.success} / {self.failure}'
+
+    class Meta:
+        verbose_name = 'итог журнала за день'
+        verbose_name_plural = 'итоги журнала по дням'
+        ordering = ['-day']
+        indexes = [
+            models.Index(fields=['owner', '-day'], name='logdaily_owner_day_idx'),
+            models.Index(fields=['day'], name='logdaily_day_idx'),
+        ]
+
+
+class OwnerStats(models.Model): # счётчики пользователя для главной страницы, обновляются сигналами
+    owner = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True,
+                                 verbose_name='пользователь')
+    mailing_amount = models.IntegerField(default=0, verbose_name='всего рассылок')
+    active_mailing_amount = models.IntegerField(default=0, verbose_name='активных рассылок')
+    client_amount = models.IntegerField(default=0, verbose_name='клиентов в базе')
+    reconciled_at = models.DateTimeField(default=timezone.now, verbose_name='последняя сверка')
+
+    def __str__(self):
+        return f'{self.owner_id}: {self.mailing_amount} / {self.active_mailing_amount} / {self.client_amount}'
+
+    class Meta:
+        verbose_name = 'статистика пользователя'
+        verbose_name_plural = 'статистика пользователей'
+
+
+class Outbox(models.Model): # очередь исходящих писем: строка на каждого получателя каждого запуска рассылки
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUSES_UNFINISHED = [STATUS_PENDING, STATUS_SENDING]  # письма без итога: ждут отправки или отправляются
+    STATUSES = [
+        (STATUS_PENDING, 'ожидает отправки'),
+        (STATUS_SENDING, 'отправляется'),
+        (STATUS_SENT, 'отправлено'),
+        (STATUS_FAILED, 'ошибка'),
+    ]
+    mailing_model = models.ForeignKey(MailingModel, on_delete=models.CASCADE, verbose_name='рассылка')
+    run_at = models.DateTimeField(verbose_name='запуск рассылки')
+    mail = models.EmailField(max_length=50, verbose_name='email получателя')
+    name = models.CharField(max_length=50, blank=True, verbose_name='имя получателя')
+    status = models.CharField(max_length=10, choices=STATUSES, default=STATUS_PENDING, verbose_name='статус')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='попыток отправки')
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name='следующая попытка')
+    error_message = models.TextField(blank=True, verbose_name='последняя ошибка')
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, **NULLABLE,
+                              verbose_name='пользователь')
+
+    def __str__(self):
+        return f'{self.mailing_model_id} ({self.run_at}) -> {self.mail}: {self.status}'
+
+    class Meta:
+        verbose_name = 'исходящее письмо'
+        verbose_name_plural = 'исходящие письма'
+        unique_together = ('mailing_model', 'run_at', 'mail')
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_pending_idx'),
+            models.Index(fields=['mailing_model', 'run_at', 'status'], name='outbox_run_status_idx'),
+            models.Index(fields=['owner', 'status', 'next_attempt_at'], name='outbox_owner_ready_idx'),
+        ]
+
+
+class MailingRun(models.Model): # запуск рассылки: итог в журнал пишется один раз, когда отправлены все его письма
+    mailing_model = models.ForeignKey(MailingModel, on_delete=models.CASCADE, verbose_name='рассылка')
+    run_at = models.DateTimeField(verbose_name='запуск рассылки')
+    summarized = models.BooleanField(default=False, verbose_name='итог записан')
+
+    def __str__(self):
+        return f'{self.mailing_model_id} ({self.run_at})'
+
+    class Meta:
+        verbose_name = 'запуск рассылки'
+        verbose_name_plural = 'запуски рассылок'
+        unique_together = ('mailing_model', 'run_at')
+        indexes = [
+            models.Index(fields=['summarized', 'run_at'], name='mailingrun_summarized_idx'),
+        ]
+
+
+class MetricCounter(models.Model): # накопленные метрики планировщика рассылок, общие для всех процессов
+    name = models.CharField(max_length=100, primary_key=True, verbose_name='метрика')
+    value = models.FloatField(default=0, verbose_name='значение')
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
+
+    class Meta:
+        verbose_name = 'метрика'
+        verbose_name_plural = 'метрики'
@@ -0,0 +1,119 @@
+import base64
+import json
+
+from django.db import connection
+from django.db.models import Q
+
+
+def encode_cursor(values):
+    """Курсор страницы - значения полей сортировки граничной строки"""
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, ordering):
+    """Разбирает курсор обратно в значения полей сортировки (None, если курсор испорчен)"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return [model._meta.get_field(field.lstrip('-')).to_python(value) for field, value in zip(ordering, values)]
+    except Exception:
+        return None
+
+
+def reverse_ordering(ordering):
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+
+def keyset_filter(ordering, values):
+    """Условие "строки после строки со значениями values" при сортировке ordering:
+    (a > x) or (a = x and b > y) ..., плюс a >= x, чтобы база искала по индексу диапазоном"""
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        condition |= equal & Q(**{f'{name}__{"lt" if field.startswith("-") else "gt"}': value})
+        equal &= Q(**{name: value})
+    first = ordering[0]
+    return Q(**{f'{first.lstrip("-")}__{"lte" if first.startswith("-") else "gte"}': values[0]}) & condition
+
+
+def estimated_count(queryset):
+    """Примерное число строк по статистике PostgreSQL: для всей таблицы - pg_class.reltuples,
+    для запроса с фильтром - оценка планировщика (EXPLAIN), без COUNT(*) по всем строкам"""
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    if not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        return max(int(row[0]), 0) if row else 0
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPage:
+    """Страница, найденная по курсору: строки и курсоры соседних страниц"""
+
+    def __init__(self, paginator, object_list, has_next, has_previous):
+        self.paginator = paginator
+        self.object_list = object_list
+        self.has_next_page = has_next
+        self.has_previous_page = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.has_next_page
+
+    def has_previous(self):
+        return self.has_previous_page
+
+    def has_other_pages(self):
+        return self.has_next_page or self.has_previous_page
+
+    def next_cursor(self):
+        return self.paginator.cursor(self.object_list[-1]) if self.has_next_page else None
+
+    def previous_cursor(self):
+        return self.paginator.cursor(self.object_list[0]) if self.has_previous_page and self.object_list else None
+
+
+class KeysetPaginator:
+    """Листание по ключу сортировки (по умолчанию (time, id) от новых к старым) вместо OFFSET:
+    любая страница читается по индексу за одно и то же время, сколько бы строк ни было до неё.
+    Последнее поле сортировки должно быть уникальным (id)"""
+
+    def __init__(self, queryset, per_page, ordering=('-time', '-id'), estimate_count=False):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = list(ordering)
+        self.estimate_count = estimate_count and connection.vendor == 'postgresql'
+        self._count = None
+
+    def cursor(self, obj):
+        return encode_cursor([getattr(obj, obj._meta.get_field(field.lstrip('-')).attname) for field in self.ordering])
+
+    def page(self, after=None, before=None):
+        """Страница после курсора after, перед курсором before или первая"""
+        model = self.queryset.model
+        if before and (values := decode_cursor(before, model, self.ordering)):
+            ordering = reverse_ordering(self.ordering)
+            rows = list(self.queryset.filter(keyset_filter(ordering, values)).order_by(*ordering)[:self.per_page + 1])
+            return KeysetPage(self, rows[:self.per_page][::-1], True, len(rows) > self.per_page)
+
+        queryset = self.queryset
+        values = decode_cursor(after, model, self.ordering) if after else None
+        if values:
+            queryset = queryset.filter(keyset_filter(self.ordering, values))
+        rows = list(queryset.order_by(*self.ordering)[:self.per_page + 1])
+        return KeysetPage(self, rows[:self.per_page], len(rows) > self.per_page, bool(values))
+
+    @property
+    def count(self):
+        """Число строк: точное или оценка по статистике PostgreSQL (estimate_count)"""
+        if self._count is None:
+            self._count = estimated_count(self.queryset) if self.estimate_count else self.queryset.count()
+        return self._count
@@ -0,0 +1,137 @@
+import threading
+import time
+
+import redis
+from django.conf import settings
+
+# атомарно пополняет ведро по прошедшему времени и выдаёт до amount токенов,
+# отрицательный amount возвращает токены в ведро
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local amount = tonumber(ARGV[3])
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * rate)
+local granted = 0
+if amount < 0 then
+    tokens = math.min(capacity, tokens - amount)
+else
+    granted = math.min(amount, math.floor(tokens))
+    tokens = tokens - granted
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return granted
+"""
+
+_redis_client = None
+_local_buckets = {}
+_local_lock = threading.Lock()
+
+
+def get_redis():
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.MAILING_RATE_LIMIT_REDIS)
+    return _redis_client
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity.
+    Состояние хранится в Redis (общее для всех процессов), без Redis - в памяти процесса"""
+
+    def __init__(self, key, rate, capacity=None):
+        self.key = f'mailing:bucket:{key}'
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+
+    def take(self, amount):
+        """Забирает до amount токенов, возвращает сколько выдано (rate = 0 - без ограничения)"""
+        if not self.rate or amount <= 0:
+            return max(amount, 0)
+        return self._call(amount)
+
+    def give_back(self, amount):
+        """Возвращает неиспользованные токены в ведро"""
+        if self.rate and amount > 0:
+            self._call(-amount)
+
+    def _call(self, amount):
+        if settings.MAILING_RATE_LIMIT_REDIS:
+            return int(get_redis().eval(TOKEN_BUCKET_SCRIPT, 1, self.key, self.rate, self.capacity, amount))
+
+        with _local_lock:
+            now = time.monotonic()
+            tokens, ts = _local_buckets.get(self.key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - ts) * self.rate)
+            granted = 0
+            if amount < 0:
+                tokens = min(self.capacity, tokens - amount)
+            else:
+                granted = min(amount, int(tokens))
+                tokens -= granted
+            _local_buckets[self.key] = (tokens, now)
+            return granted
+
+
+def relay_bucket(relay):
+    """Ограничение скорости на SMTP-релей (аккаунт), через который уходят письма"""
+    return TokenBucket(f'smtp:{relay.host}:{relay.username}', relay.rate, relay.burst)
+
+
+def take_relay_tokens(relay, messages):
+    """Забирает токены релея на получателей писем по порядку.
+    Возвращает, сколько первых писем можно отправить сейчас, токены сверх этого возвращает"""
+    bucket = relay_bucket(relay)
+    sizes = [len(message.recipients()) for message in messages]
+    granted = bucket.take(sum(sizes))
+    allowed = used = 0
+    for size in sizes:
+        if used + size > granted:
+            break
+        used += size
+        allowed += 1
+    bucket.give_back(granted - used)
+    return allowed
+
+
+def owner_bucket(owner_id):
+    """Ограничение скорости на пользователя сервиса"""
+    return TokenBucket(f'owner:{owner_id}', settings.MAILING_OWNER_RATE, settings.MAILING_OWNER_BURST)
+
+
+def round_robin(groups):
+    """Чередует элементы групп: по одному из каждой группы по кругу"""
+    result = []
+    for index in range(max((len(group) for group in groups), default=0)):
+        result.extend(group[index] for group in groups if index < len(group))
+    return result
+
+
+def throttle_letters(letters):
+    """Делит письма очереди на те, что можно отправить сейчас, и отложенные по лимиту пользователя.
+    Пользователи обслуживаются по кругу, поэтому одна большая рассылка не забирает весь лимит релеев"""
+    owners = {}
+    for letter in letters:
+        owners.setdefault(letter.owner_id, []).append(letter)
+
+    allowed = []
+    deferred = []
+    for owner_id, owner_letters in owners.items():
+        granted = owner_bucket(owner_id).take(len(owner_letters))
+        allowed.append(owner_letters[:granted])
+        deferred.extend(owner_letters[granted:])
+    return round_robin(allowed), deferred
+
+
+def refund_owners(letters):
+    """Возвращает пользователям лимит за письма, которые так и не были отправлены"""
+    refunds = {}
+    for letter in letters:
+        refunds[letter.owner_id] = refunds.get(letter.owner_id, 0) + 1
+    for owner_id, amount in refunds.items():
+        owner_bucket(owner_id).give_back(amount)
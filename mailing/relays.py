@@ -0,0 +1,106 @@
+import random
+import time
+from smtplib import SMTPAuthenticationError, SMTPConnectError, SMTPException, SMTPResponseException, \
+    SMTPServerDisconnected
+
+from django.conf import settings
+from django.core.cache import cache
+
+RELAY_CACHE_KEY = 'mailing_relay:{}'
+
+
+class RelayThrottled(Exception):
+    """Письмо не отправлено через релей: исчерпан его лимит скорости. Это не сбой релея"""
+
+
+class Relay:
+    """SMTP-релей из MAILING_SMTP_RELAYS: параметры подключения, вес и состояние (задержка, недоступность)"""
+
+    def __init__(self, name, host, port, username=None, password=None, use_tls=False, use_ssl=False,
+                 weight=1, from_email=None, rate=None, burst=None):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.use_ssl = use_ssl
+        self.weight = weight
+        self.from_email = from_email  # адрес отправителя, если релей не принимает общий EMAIL_HOST_USER
+        self.rate = settings.MAILING_SMTP_RATE if rate is None else rate  # лимит скорости: получателей в секунду
+        self.burst = burst or settings.MAILING_SMTP_BURST
+
+    def __str__(self):
+        return self.name
+
+    def connection_kwargs(self):
+        """Параметры для get_connection и AsyncSMTPBackend"""
+        return {
+            'host': self.host, 'port': self.port, 'username': self.username, 'password': self.password,
+            'use_tls': self.use_tls, 'use_ssl': self.use_ssl,
+        }
+
+    def get_state(self):
+        return cache.get(RELAY_CACHE_KEY.format(self.name)) or {'latency': None, 'down_until': 0}
+
+    def is_healthy(self):
+        return self.get_state()['down_until'] <= time.time()
+
+    def score(self):
+        """Доля писем релея: вес, делённый на среднюю задержку отправки одного письма"""
+        latency = self.get_state()['latency']
+        return self.weight / latency if latency else self.weight
+
+    def report(self, seconds, messages, failed):
+        """Запоминает задержку отправки (скользящее среднее), при сбое выводит релей из работы на время"""
+        state = self.get_state()
+        if failed:
+            state['down_until'] = time.time() + settings.MAILING_RELAY_COOLDOWN
+        elif messages:
+            latency = seconds / messages
+            state['latency'] = latency if state['latency'] is None else 0.8 * state['latency'] + 0.2 * latency
+            state['down_until'] = 0
+        cache.set(RELAY_CACHE_KEY.format(self.name), state, None)
+
+
+def get_relays():
+    """Релеи из настроек, по умолчанию - единственный релей из EMAIL_HOST/EMAIL_HOST_USER"""
+    if settings.MAILING_SMTP_RELAYS:
+        return [Relay(**config) for config in settings.MAILING_SMTP_RELAYS]
+    return [Relay('default', settings.EMAIL_HOST, settings.EMAIL_PORT, settings.EMAIL_HOST_USER,
+                  settings.EMAIL_HOST_PASSWORD, settings.EMAIL_USE_TLS, settings.EMAIL_USE_SSL)]
+
+
+def is_relay_error(err):
+    """Ошибка самого релея (недоступен, разорвал соединение, отклонил авторизацию), а не конкретного письма.
+    Отказы по адресам и содержимому (SMTPRecipientsRefused, SMTPDataError, 5xx) относятся к письму"""
+    if isinstance(err, (SMTPAuthenticationError, SMTPConnectError, SMTPServerDisconnected)):
+        return True
+    if isinstance(err, SMTPResponseException):
+        return err.smtp_code == 421  # сервис недоступен
+    if isinstance(err, SMTPException):  # SMTPException наследует OSError, но это ошибка протокола, а не сети
+        return False
+    return isinstance(err, OSError)
+
+
+def split_between_relays(indexes, relays):
+    """Делит письма между релеями пропорционально их весу и скорости"""
+    scores = [relay.score() for relay in relays]
+    total = sum(scores)
+    parts = []
+    start = 0
+    for number, (relay, score) in enumerate(zip(relays, scores)):
+        end = len(indexes) if number == len(relays) - 1 else start + round(len(indexes) * score / total)
+        if end > start:
+            parts.append((relay, indexes[start:end]))
+        start = end
+    return parts
+
+
+def choose_relays(exclude=()):
+    """Возвращает рабочие релеи в случайном порядке; если упали все, пробуем все, чтобы не останавливать рассылки"""
+    relays = [relay for relay in get_relays() if relay.name not in exclude]
+    healthy = [relay for relay in relays if relay.is_healthy()]
+    relays = healthy or relays
+    random.shuffle(relays)
+    return relays
@@ -0,0 +1,134 @@
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Max, Min, Q, Sum
+
+from mailing.models import LogList, LogDaily
+
+PARTITION_PREFIX = f'{LogList._meta.db_table}_p'  # разделы журнала: mailing_loglist_p202401 и т.д.
+DEFAULT_PARTITION = f'{LogList._meta.db_table}_default'  # записи вне созданных разделов
+
+
+def month_start(day, months=0):
+    """Первое число месяца, сдвинутого на months от месяца дня day"""
+    month = day.year * 12 + day.month - 1 + months
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def is_partitioned():
+    """Журнал разбит на разделы по месяцам (только PostgreSQL, см. миграцию 0024)"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass', [LogList._meta.db_table])
+        return cursor.fetchone() is not None
+
+
+def create_log_partition(cursor, month):
+    """Создаёт раздел журнала за месяц, если его ещё нет. Если cron долго не запускался, записи этого месяца
+    уже лежат в разделе по умолчанию, и PostgreSQL не даст создать раздел поверх них: тогда раздел по умолчанию
+    отсоединяется, записи месяца переносятся в новый раздел, и раздел по умолчанию подключается обратно.
+    Вызывать в транзакции"""
+    table = LogList._meta.db_table
+    bounds = [str(month), str(month_start(month, 1))]
+    create_sql = (f'CREATE TABLE IF NOT EXISTS {PARTITION_PREFIX}{month:%Y%m} PARTITION OF {table} '
+                  f'FOR VALUES FROM (%s) TO (%s)')
+    cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE "time" >= %s AND "time" < %s)', bounds)
+    if not cursor.fetchone()[0]:
+        cursor.execute(create_sql, bounds)
+        return
+
+    cursor.execute(f'ALTER TABLE {table} DETACH PARTITION {DEFAULT_PARTITION}')
+    cursor.execute(create_sql, bounds)
+    cursor.execute(f'INSERT INTO {table} SELECT * FROM {DEFAULT_PARTITION} WHERE "time" >= %s AND "time" < %s', bounds)
+    cursor.execute(f'DELETE FROM {DEFAULT_PARTITION} WHERE "time" >= %s AND "time" < %s', bounds)
+    cursor.execute(f'ALTER TABLE {table} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT')
+
+
+def get_log_partitions():
+    """Месяцы, за которые есть разделы журнала"""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+                       'WHERE i.inhparent = %s::regclass', [LogList._meta.db_table])
+        names = [row[0] for row in cursor.fetchall()]
+    return sorted(datetime.strptime(name[len(PARTITION_PREFIX):], '%Y%m').date()
+                  for name in names if name.startswith(PARTITION_PREFIX) and name[len(PARTITION_PREFIX):].isdigit())
+
+
+def ensure_log_partitions(today, months_ahead=None):
+    """Заранее создаёт разделы журнала на текущий и следующие месяцы"""
+    months_ahead = settings.MAILING_LOG_PARTITIONS_AHEAD if months_ahead is None else months_ahead
+    existing = set(get_log_partitions())
+    with transaction.atomic(), connection.cursor() as cursor:
+        for months in range(months_ahead + 1):
+            month = month_start(today, months)
+            if month not in existing:
+                create_log_partition(cursor, month)
+
+
+def rollup_logs(day):
+    """Пересчитывает итоги журнала за день по рассылкам и пользователям (повторный запуск перезаписывает итоги).
+    Считаются только итоговые записи запусков, записи об ошибках по отдельным получателям не учитываются"""
+    start = datetime.combine(day, time.min)
+    totals = LogList.objects.filter(
+        time__gte=start, time__lt=start + timedelta(days=1), error_type__in=[LogList.SUCCESS, LogList.PARTIAL]
+    ).order_by().values(
+        'mailing_model_id', 'owner_id'
+    ).annotate(
+        success=Count('pk', filter=Q(error_type=LogList.SUCCESS)),
+        failure=Count('pk', filter=Q(error_type=LogList.PARTIAL)),
+    )
+    with transaction.atomic():
+        LogDaily.objects.filter(day=day).delete()
+        LogDaily.objects.bulk_create([LogDaily(day=day, **row) for row in totals])
+
+
+def get_daily_totals(owner, days=None):
+    """Итоги запусков рассылок пользователя по дням (из LogDaily, без подсчёта по журналу), последние дни первыми"""
+    days = settings.MAILING_LOG_DAILY_DAYS if days is None else days
+    since = datetime.now().date() - timedelta(days=days)
+    return LogDaily.objects.filter(owner=owner, day__gte=since).values('day').annotate(
+        success=Sum('success'), failure=Sum('failure')
+    ).order_by('-day')
+
+
+def rollup_missing_days(today):
+    """Подводит итоги за все прошедшие дни после последнего подсчитанного (если cron пропускал запуски)"""
+    last_day = LogDaily.objects.aggregate(last=Max('day'))['last']
+    if last_day is None:
+        first_time = LogList.objects.aggregate(first=Min('time'))['first']
+        if first_time is None:
+            return
+        last_day = first_time.date() - timedelta(days=1)
+    day = last_day + timedelta(days=1)
+    while day < today:
+        rollup_logs(day)
+        day += timedelta(days=1)
+
+
+def drop_old_logs(today, keep_months=None):
+    """Удаляет журнал старше keep_months месяцев. На PostgreSQL - удалением целых разделов (DROP TABLE),
+    без построчного DELETE и последующего VACUUM. Возвращает месяцы удалённых разделов"""
+    keep_months = settings.MAILING_LOG_RETENTION_MONTHS if keep_months is None else keep_months
+    cutoff = month_start(today, -keep_months)
+    if not is_partitioned():
+        LogList.objects.filter(time__lt=datetime.combine(cutoff, time.min)).delete()
+        return []
+
+    dropped = [month for month in get_log_partitions() if month < cutoff]
+    with connection.cursor() as cursor:
+        for month in dropped:
+            cursor.execute(f'DROP TABLE {PARTITION_PREFIX}{month:%Y%m}')
+        cursor.execute(f'DELETE FROM {DEFAULT_PARTITION} WHERE "time" < %s', [cutoff])
+    return dropped
+
+
+def maintain_logs():
+    """Ежедневное обслуживание журнала: итоги по дням, разделы на будущие месяцы, удаление старых разделов.
+    Итоги считаются до удаления, поэтому статистика по удалённым месяцам остаётся в LogDaily"""
+    today = datetime.now().date()
+    rollup_missing_days(today)
+    if is_partitioned():
+        ensure_log_partitions(today)
+    drop_old_logs(today)
@@ -1,59 +1,502 @@
 from django.core.cache import cache
 from django.core.management import BaseCommand
-from mailing.models import Client, MailingModel, Message, MailingList, LogList
-from datetime import datetime
-from django.core.mail import send_mail
+from mailing.backends import AsyncSMTPBackend
+from mailing.metrics import TickMetrics
+from mailing.mime import SharedBodyEmailMessage, get_shared_body
+from mailing.models import Client, MailingModel, Message, MailingList, LogList, MailingRun, Outbox
+from mailing.ratelimit import refund_owners, round_robin, take_relay_tokens, throttle_letters
+from mailing.relays import RelayThrottled, choose_relays, is_relay_error, split_between_relays
+from mailing.templating import is_personalized, render_message
+from datetime import datetime, timedelta
+from django.core.mail import EmailMessage, get_connection
 from django.conf import settings
-from smtplib import SMTPException
+from django.db import transaction
+from django.db.models import Count, Exists, F, Min, OuterRef, Q
+from django.db.models.functions import Mod
+from smtplib import SMTPException, SMTPRecipientsRefused, SMTPResponseException, SMTPServerDisconnected
 import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from math import ceil
 
 
-def check_adn_run_mailings():
-    """Просматривает все рассылки, проверяет время, если время рассылки, отправляет письма"""
-    if settings.CACHE_ENABLED:  # кешируем, чтобы не мучать бд каждую минуту
-        key = 'all_mailings'
-        all_mailings = cache.get(key)
-        if all_mailings is None:
-            all_mailings = MailingModel.objects.all()
-            cache.set(key, all_mailings)
+class MessageMissing(Exception):
+    """Письмо рассылки удалено, пока её письма ждали отправки в очереди"""
+
+
+class MailDelivery:
+    """Отправляет письма через одно SMTP-соединение на весь запуск, переподключаясь при сбоях"""
+
+    def __init__(self, metrics=None, relay=None):
+        self.connection = None
+        self.metrics = metrics
+        self.relay = relay
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def open(self):
+        if self.connection is None:
+            relay_kwargs = self.relay.connection_kwargs() if self.relay is not None else {}
+            self.connection = get_connection(fail_silently=False, **relay_kwargs)
+        start = time.perf_counter()
+        self.connection.open()
+        if self.metrics is not None:  # время подключения суммируется по всем потокам отправки
+            self.metrics.add_time('smtp_connect', time.perf_counter() - start)
+            self.metrics.count('smtp_connections')
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:  # соединение уже могло быть разорвано сервером
+                pass
+
+    def reconnect(self):
+        self.close()
+        self.open()
+
+    def send(self, messages):
+        """Отправляет письма по одному через открытое соединение, возвращает список ошибок (None - письмо ушло).
+        send_messages пачкой прерывается на первом отказе, когда письма до него уже доставлены, поэтому
+        итог каждого письма фиксируется отдельно и ничего не отправляется повторно"""
+        errors = []
+        need_reconnect = False
+        for message in messages:
+            try:
+                if need_reconnect:
+                    self.reconnect()
+                self.connection.send_messages([message])
+            except Exception as err:
+                errors.append(err)
+                # отказ в адресе или письме сессию не ломает, переподключаемся только при сбое соединения
+                need_reconnect = need_reconnect or is_relay_error(err)
+            else:
+                errors.append(None)
+                need_reconnect = False
+        return errors
+
+
+def split_recipients(emails_list, chunk_size=None):
+    """Разбивает адреса рассылки (любой итерируемый объект) на пачки по chunk_size получателей"""
+    chunk_size = chunk_size or settings.MAILING_RECIPIENTS_PER_MESSAGE
+    emails_list = iter(emails_list)
+    while chunk := list(islice(emails_list, chunk_size)):
+        yield chunk
+
+
+def build_message(title, message, recipients):
+    """Делает письмо рассылки для пачки получателей"""
+    if len(recipients) == 1:
+        return EmailMessage(title, message, settings.EMAIL_HOST_USER, recipients)
+    # при отправке пачкой скрываем адреса получателей друг от друга
+    return EmailMessage(title, message, settings.EMAIL_HOST_USER, bcc=recipients)
+
+
+def build_shared_message(shared, recipients):
+    """Делает письмо рассылки для пачки получателей из заранее закодированного общего тела"""
+    if len(recipients) == 1:
+        return SharedBodyEmailMessage(shared, settings.EMAIL_HOST_USER, recipients)
+    return SharedBodyEmailMessage(shared, settings.EMAIL_HOST_USER, bcc=recipients)
+
+
+def build_messages(title, message, emails_list):
+    """Делает из рассылки отдельные письма на каждую пачку получателей"""
+    return [build_message(title, message, recipients) for recipients in split_recipients(emails_list)]
+
+
+def send_via_relay(relay, messages, workers=None, metrics=None):
+    """Отправляет письма через один SMTP-релей: asyncio-бэкендом или в несколько потоков,
+    у каждого потока своё SMTP-соединение. Письма сверх лимита скорости релея не отправляются (RelayThrottled).
+    Возвращает ошибки в том же порядке, что и письма"""
+    allowed = take_relay_tokens(relay, messages)
+    throttled = [RelayThrottled(f'исчерпан лимит скорости релея {relay}')] * (len(messages) - allowed)
+    messages = messages[:allowed]
+    if not messages:
+        return throttled
+    for message in messages:
+        message.from_email = relay.from_email or settings.EMAIL_HOST_USER or settings.DEFAULT_FROM_EMAIL
+    start = time.perf_counter()
+
+    if settings.MAILING_ASYNC_DELIVERY:  # все SMTP-сессии в одном потоке на asyncio
+        backend = AsyncSMTPBackend(**relay.connection_kwargs())
+        errors = backend.send_with_errors(messages)
+        if metrics is not None:
+            metrics.add_time('smtp_async', time.perf_counter() - start)
+            metrics.count('smtp_connections', backend.connections)
     else:
-        all_mailings = MailingModel.objects.all()
-
-    all_mailings = all_mailings.filter(is_active=True)  # оаставляем только активные рассылки
-
-#    all_mailings = MailingModel.objects.all()
-    current_time = datetime.now().time()
-    current_week_day = datetime.now().isoweekday()
-
-    for mailing in all_mailings:  # для каждой рассылки проверяем время и день недели
-        if mailing.time_from <= current_time <= mailing.time_to and \
-                (current_week_day == mailing.week_day or mailing.week_day is None):
-
-            if not mailing.sent:  # проверяем флаг, что рассылка в указанное время ещё не производилась
-
-                title = mailing.message.title  # забираем заголовок письма
-                message = mailing.message.message  # забираем текст рассылки
-                # выгружаем адреса клиентов
-                emails_list = [letter.client.mail for letter in MailingList.objects.filter(mailing_model=mailing.pk)]
-
-                try:
-                    send_mail(title, message, settings.EMAIL_HOST_USER, emails_list)
-                except Exception as err:  # записываем в лог, если были ошибки
-                    loglist = LogList(mailing_model_id=mailing.pk, error_type=type(err), error_message=err.__str__())
-                    loglist.save()
-                else:  # если рассылка прошла, выставляем флаг
-                    loglist = LogList(mailing_model_id=mailing.pk, error_type='successful!', error_message='successful!')
-                    loglist.save()
-                    record = MailingModel.objects.get(pk=mailing.pk)
-                    record.sent = True
-                    record.save(update_fields=['sent'])
-
-        else:
-            # если сейчас не время рассылки, но она производилась в прошедший период
-            # и флаг ещё True, то сбрасываем его в False
-            if mailing.sent:
-                record = MailingModel.objects.get(pk=mailing.pk)
-                record.sent = False
-                record.save(update_fields=['sent'])
-
-    print('!!!!!!!!!!!!!!!!!!!')
\ No newline at end of file
+        workers = max(1, min(workers or settings.MAILING_WORKERS, len(messages)))
+        parts = [messages[i::workers] for i in range(workers)]
+
+        def send_part(part):
+            try:
+                with MailDelivery(metrics=metrics, relay=relay) as delivery:
+                    return delivery.send(part)
+            except Exception as err:  # не удалось подключиться к SMTP-серверу
+                return [err] * len(part)
+
+        errors = [None] * len(messages)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for i, part_errors in enumerate(executor.map(send_part, parts)):
+                errors[i::workers] = part_errors
+
+    relay_errors = sum(err is not None and is_relay_error(err) for err in errors)
+    relay.report(time.perf_counter() - start, len(messages), failed=relay_errors > len(messages) / 2)
+    return errors + throttled
+
+
+def deliver_messages(messages, workers=None, metrics=None):
+    """Распределяет письма между SMTP-релеями по весу и скорости, отправляет через них параллельно.
+    Письма, не ушедшие из-за сбоя релея или его лимита скорости, переотправляются через другие релеи.
+    Возвращает ошибки в том же порядке, что и письма (None - письмо ушло)"""
+    errors = [None] * len(messages)
+    pending = list(range(len(messages)))
+    failed_relays = set()
+    throttled_relays = set()  # релеи с исчерпанным лимитом исправны, просто больше не берём их в этой отправке
+    while pending:
+        relays = choose_relays(exclude=failed_relays | throttled_relays)
+        if not relays:  # все релеи сбоят - оставляем последние ошибки
+            break
+        parts = split_between_relays(pending, relays)
+        with ThreadPoolExecutor(max_workers=len(parts)) as executor:
+            results = executor.map(
+                lambda part: send_via_relay(part[0], [messages[i] for i in part[1]], workers, metrics), parts
+            )
+            pending = []
+            for (relay, indexes), part_errors in zip(parts, results):
+                for i, err in zip(indexes, part_errors):
+                    errors[i] = err
+                    if isinstance(err, RelayThrottled):
+                        pending.append(i)
+                        throttled_relays.add(relay.name)
+                    elif err is not None and is_relay_error(err):
+                        pending.append(i)
+                        failed_relays.add(relay.name)
+        if pending and metrics is not None:
+            metrics.count('relay_failovers', len(pending))
+    return errors
+
+
+def is_temporary_error(err):
+    """Проверяет, что ошибка отправки временная и письмо имеет смысл отправить повторно"""
+    if isinstance(err, SMTPRecipientsRefused):  # временный отказ, только если все адреса отклонены с кодом 4xx
+        return bool(err.recipients) and all(400 <= code < 500 for code, _ in err.recipients.values())
+    if isinstance(err, SMTPResponseException):
+        return 400 <= err.smtp_code < 500
+    if isinstance(err, SMTPServerDisconnected):
+        return True
+    if isinstance(err, SMTPException):  # прочие ошибки протокола повтор не исправит
+        return False
+    return isinstance(err, OSError)  # сетевые ошибки: таймаут, сброс соединения
+
+
+SCHEDULE_CACHE_KEY = 'mailing_schedule'
+
+
+def load_schedule():
+    """Компактный снимок расписания активных рассылок: (id, начало, окончание, день недели, id письма, запуск)"""
+    return list(MailingModel.objects.filter(is_active=True, message__isnull=False).order_by().values_list(
+        'pk', 'time_from', 'time_to', 'week_day', 'message_id', 'next_run_at'
+    ))
+
+
+def get_schedule():
+    """Возвращает снимок расписания из кеша, в БД идём только если расписание менялось"""
+    schedule = cache.get(SCHEDULE_CACHE_KEY)
+    if schedule is None:
+        schedule = load_schedule()
+        cache.set(SCHEDULE_CACHE_KEY, schedule, settings.MAILING_SCHEDULE_CACHE_TIMEOUT)
+    return schedule
+
+
+def invalidate_schedule():
+    """Сбрасывает снимок расписания, вызывается при любом изменении рассылок"""
+    if settings.CACHE_ENABLED:
+        cache.delete(SCHEDULE_CACHE_KEY)
+
+
+def get_due_mailings(now):
+    """Возвращает активные рассылки своего шарда, у которых наступило время запуска"""
+    shards, shard = settings.MAILING_SHARDS, settings.MAILING_SHARD
+    if settings.CACHE_ENABLED:  # по кешу проверяем, есть ли вообще рассылки, которым пора
+        due_ids = [row[0] for row in get_schedule()
+                   if row[5] is not None and row[5] <= now and row[0] % shards == shard]
+        if not due_ids:
+            return MailingModel.objects.none()
+    # один запрос по индексу (is_active, next_run_at) - забираем только рассылки, которым пора,
+    # сразу вместе с текстом письма
+    mailings = MailingModel.objects.filter(
+        is_active=True, next_run_at__lte=now, message__isnull=False
+    ).select_related('message')
+    if shards > 1:  # рассылки делятся между планировщиками по остатку от деления id
+        mailings = mailings.alias(shard=Mod('pk', shards)).filter(shard=shard)
+    return mailings
+
+
+def claim_due_mailings(now):
+    """Забирает наступившие рассылки, сразу переносит их на следующее окно и ставит их письма в очередь Outbox.
+    Строки блокируются с SKIP LOCKED, поэтому параллельные планировщики не отправят одну рассылку дважды.
+    Возвращает пары (рассылка, окончание её текущего окна)"""
+    due_mailings = get_due_mailings(now)
+    if due_mailings.query.is_empty():  # по кешу расписания рассылок, которым пора, нет
+        return []
+    with transaction.atomic():
+        mailings = list(due_mailings.select_for_update(skip_locked=True, of=('self',)))
+        claimed = []
+        for mailing in mailings:
+            window_end = mailing.window_end()
+            claimed.append((mailing, window_end))
+            # рассылки, окно которых прошло без отправки (например, cron не запускался), просто переносятся
+            if now <= window_end:
+                enqueue_mailing(mailing, mailing.next_run_at)
+            reschedule_mailing(mailing, sent=False)
+        MailingModel.objects.bulk_update(mailings, ['sent', 'next_run_at'], batch_size=500)
+    if mailings:
+        invalidate_schedule()
+    return claimed
+
+
+def enqueue_mailing(mailing, run_at):
+    """Ставит в очередь Outbox письма запуска рассылки всем её активным клиентам и запоминает запуск,
+    чтобы записать его итог, когда письма будут отправлены"""
+    letters = (Outbox(mailing_model_id=mailing.pk, run_at=run_at, mail=mail, name=name, next_attempt_at=run_at,
+                      owner_id=mailing.owner_id)
+               for mail, name in get_mailing_recipients(mailing))
+    enqueued = False
+    while batch := list(islice(letters, settings.MAILING_RECIPIENTS_CHUNK_SIZE)):
+        # повторная постановка того же запуска ничего не дублирует
+        Outbox.objects.bulk_create(batch, ignore_conflicts=True)
+        enqueued = True
+    if enqueued:
+        MailingRun.objects.bulk_create([MailingRun(mailing_model_id=mailing.pk, run_at=run_at)], ignore_conflicts=True)
+
+
+def get_mailing_recipients(mailing):
+    """Потоково выгружает адреса и имена активных клиентов рассылки одним запросом с join"""
+    return MailingList.objects.filter(
+        mailing_model=mailing.pk, client__is_active=True
+    ).values_list('client__mail', 'client__name').iterator(chunk_size=settings.MAILING_RECIPIENTS_CHUNK_SIZE)
+
+
+def reschedule_mailing(mailing, sent):
+    """Запоминает итог рассылки и планирует её на следующее окно (сохраняет изменения flush_mailings)"""
+    mailing.sent = sent
+    mailing.schedule_next_run(mailing.window_end() + timedelta(microseconds=1))
+
+
+def select_outbox_letters(now, batch_size):
+    """Блокирует пачку готовых к отправке писем очереди, письма разных пользователей берутся по очереди:
+    сначала первое письмо каждого пользователя, потом второе и т.д."""
+    # письма в статусе "отправляется" попадают сюда, только если их аренда истекла (процесс упал во время отправки)
+    ready = Outbox.objects.filter(status__in=Outbox.STATUSES_UNFINISHED, next_attempt_at__lte=now)
+    # пользователи с готовыми письмами, дольше всех ждущие отправки
+    owner_ids = list(ready.order_by().values('owner_id').annotate(
+        first_attempt_at=Min('next_attempt_at')
+    ).order_by('first_attempt_at').values_list('owner_id', flat=True)[:batch_size])
+    if not owner_ids:
+        return []
+    # каждому пользователю - своя доля блокируемых писем (ORDER BY ... LIMIT ... FOR UPDATE SKIP LOCKED
+    # по индексу outbox_owner_ready_idx), поэтому большая рассылка не занимает всю пачку
+    per_owner = min(batch_size, ceil(batch_size * settings.MAILING_OUTBOX_CANDIDATES_FACTOR / len(owner_ids)))
+    owners = [
+        list(ready.filter(owner_id=owner_id).order_by('next_attempt_at').select_related(
+            'mailing_model__message'
+        ).select_for_update(skip_locked=True, of=('self',))[:per_owner])
+        for owner_id in owner_ids
+    ]
+    return round_robin(owners)[:batch_size]
+
+
+def claim_outbox_letters(now, batch_size, metrics):
+    """Короткой транзакцией забирает пачку писем в аренду: переводит их в статус "отправляется"
+    до now + MAILING_OUTBOX_LEASE. Письма сверх лимитов скорости откладываются"""
+    with transaction.atomic():
+        letters = select_outbox_letters(now, batch_size)
+        letters, deferred = throttle_letters(letters)
+        if deferred:  # лимит исчерпан - откладываем письма, не считая это попыткой отправки
+            Outbox.objects.filter(pk__in=[letter.pk for letter in deferred]).update(
+                status=Outbox.STATUS_PENDING, next_attempt_at=now + timedelta(seconds=settings.MAILING_THROTTLE_DELAY)
+            )
+            metrics.count('messages_throttled', len(deferred))
+        if letters:
+            Outbox.objects.filter(pk__in=[letter.pk for letter in letters]).update(
+                status=Outbox.STATUS_SENDING, next_attempt_at=now + timedelta(seconds=settings.MAILING_OUTBOX_LEASE)
+            )
+    return letters
+
+
+def send_outbox_batch(metrics=None, batch_size=None):
+    """Отправляет пачку готовых к отправке писем из очереди Outbox и записывает итог каждого письма.
+    Письма забираются в аренду короткой транзакцией, отправка идёт без открытой транзакции и блокировок,
+    итоги пишутся после каждой группы из MAILING_OUTBOX_RESULT_GROUP сообщений. При падении процесса
+    неотправленные письма группы вернутся в очередь, когда истечёт аренда.
+    Возвращает число писем, взятых в отправку"""
+    metrics = metrics or TickMetrics()
+    now = datetime.now()
+    with metrics.phase('recipients'):
+        letters = claim_outbox_letters(now, batch_size or settings.MAILING_OUTBOX_BATCH_SIZE, metrics)
+        if not letters:
+            return 0
+
+        mailing_letters = defaultdict(list)
+        for letter in letters:
+            mailing_letters[letter.mailing_model_id].append(letter)
+        emails = []
+        chunks = []  # письма очереди, которые ушли одним сообщением
+        broken_chunks = []  # письма, которые не удалось собрать, и ошибки по ним
+        broken_errors = []
+        for group in mailing_letters.values():
+            message = group[0].mailing_model.message
+            if message is None:  # сообщение удалено (SET_NULL), отправлять нечего
+                broken_chunks.append(group)
+                broken_errors.append(MessageMissing('сообщение рассылки удалено'))
+                continue
+            if is_personalized(message):  # каждому получателю своё письмо со своими данными
+                for letter in group:
+                    try:
+                        title, text = render_message(message, letter.name, letter.mail)
+                    except Exception as err:  # ошибка подстановки не должна останавливать отправку остальных писем
+                        broken_chunks.append([letter])
+                        broken_errors.append(err)
+                        continue
+                    emails.append(build_message(title, text, [letter.mail]))
+                    chunks.append([letter])
+                continue
+            shared = get_shared_body(message)  # MIME-тело кодируется один раз на всех получателей
+            for chunk in split_recipients(group):
+                emails.append(build_shared_message(shared, [letter.mail for letter in chunk]))
+                chunks.append(chunk)
+    metrics.count('messages', len(emails))
+
+    if broken_chunks:  # такие письма не отправить и повтором - сразу записываем ошибку
+        metrics.count('messages_failed', len(broken_chunks))
+        with metrics.phase('log_write'):
+            with transaction.atomic():
+                LogList.objects.bulk_create(write_outbox_results(broken_chunks, broken_errors, now), batch_size=500)
+
+    group_size = settings.MAILING_OUTBOX_RESULT_GROUP
+    for start in range(0, len(emails), group_size):
+        with metrics.phase('send'):
+            errors = deliver_messages(emails[start:start + group_size], metrics=metrics)
+        throttled = sum(isinstance(err, RelayThrottled) for err in errors)
+        metrics.count('messages_failed', sum(err is not None for err in errors) - throttled)
+        metrics.count('messages_throttled', throttled)
+
+        with metrics.phase('log_write'):
+            with transaction.atomic():
+                loglists = write_outbox_results(chunks[start:start + group_size], errors, datetime.now())
+                LogList.objects.bulk_create(loglists, batch_size=500)
+    return len(letters)
+
+
+def write_outbox_results(chunks, errors, now):
+    """Сохраняет статусы писем очереди, выставляет флаг sent и готовит записи журнала об ошибках получателей.
+    Итоги запусков рассылок пишет write_run_summaries"""
+    loglists = []
+    sent_letters = []
+    failed_letters = []
+    throttled_letters = []
+    for chunk, err in zip(chunks, errors):
+        if err is None:
+            sent_letters.extend(chunk)
+            continue
+        if isinstance(err, RelayThrottled):  # лимиты всех релеев исчерпаны - откладываем, это не попытка отправки
+            throttled_letters.extend(chunk)
+            continue
+        for letter in chunk:
+            failed_letters.append(letter)
+            letter.attempts += 1
+            letter.error_message = str(err)
+            if is_temporary_error(err) and letter.attempts < settings.MAILING_OUTBOX_ATTEMPTS:
+                # временная ошибка - вернём письмо в очередь и повторим позже с нарастающей задержкой
+                letter.status = Outbox.STATUS_PENDING
+                letter.next_attempt_at = now + timedelta(seconds=settings.MAILING_RETRY_DELAY * 2 ** (letter.attempts - 1))
+            else:  # записываем в лог ошибку по каждому получателю
+                letter.status = Outbox.STATUS_FAILED
+                loglists.append(LogList(mailing_model_id=letter.mailing_model_id, error_type=type(err),
+                                        error_message=f'{letter.mail}: {err}', owner_id=letter.owner_id))
+
+    # отправленные письма обновляем одним запросом, ошибки (их обычно мало) - построчно через bulk_update
+    if sent_letters:
+        Outbox.objects.filter(pk__in=[letter.pk for letter in sent_letters]).update(
+            status=Outbox.STATUS_SENT, attempts=F('attempts') + 1, error_message=''
+        )
+        # флаг выставляем, если письмо дошло хотя бы до одного получателя
+        MailingModel.objects.filter(pk__in={letter.mailing_model_id for letter in sent_letters}).update(sent=True)
+    Outbox.objects.bulk_update(failed_letters, ['status', 'attempts', 'next_attempt_at', 'error_message'],
+                               batch_size=500)
+    if throttled_letters:
+        Outbox.objects.filter(pk__in=[letter.pk for letter in throttled_letters]).update(
+            status=Outbox.STATUS_PENDING, next_attempt_at=now + timedelta(seconds=settings.MAILING_THROTTLE_DELAY)
+        )
+        refund_owners(throttled_letters)
+    return loglists
+
+
+def write_run_summaries():
+    """Пишет в журнал итог каждого запуска рассылки, в котором не осталось неотправленных писем.
+    Итог запуска пишет только тот процесс, которому удалось снять флаг summarized, поэтому
+    параллельные воркеры не запишут его дважды. Возвращает число записанных итогов"""
+    unfinished = Outbox.objects.filter(
+        mailing_model_id=OuterRef('mailing_model_id'), run_at=OuterRef('run_at'), status__in=Outbox.STATUSES_UNFINISHED
+    )
+    runs = MailingRun.objects.filter(summarized=False).filter(~Exists(unfinished)).values_list(
+        'pk', 'mailing_model_id', 'run_at', 'mailing_model__owner_id'
+    )
+    written = 0
+    for run_id, mailing_id, run_at, owner_id in runs:
+        with transaction.atomic():
+            if not MailingRun.objects.filter(pk=run_id, summarized=False).update(summarized=True):
+                continue  # итог уже записал другой процесс
+            totals = Outbox.objects.filter(mailing_model_id=mailing_id, run_at=run_at).aggregate(
+                delivered=Count('pk', filter=Q(status=Outbox.STATUS_SENT)), recipients=Count('pk')
+            )
+            delivered, recipients = totals['delivered'], totals['recipients']
+            if delivered == recipients:
+                LogList.objects.create(mailing_model_id=mailing_id, error_type=LogList.SUCCESS,
+                                       error_message=LogList.SUCCESS, owner_id=owner_id)
+            else:
+                LogList.objects.create(mailing_model_id=mailing_id, error_type=LogList.PARTIAL,
+                                       error_message=f'доставлено {delivered} из {recipients}', owner_id=owner_id)
+        written += 1
+    return written
+
+
+def check_adn_run_mailings():
+    """Выбирает рассылки, у которых наступило время запуска, ставит их письма в очередь и отправляет её"""
+    if settings.MAILING_USE_CELERY:  # отправкой занимаются воркеры Celery, здесь только ставим задачи
+        from mailing.tasks import dispatch_mailings
+        dispatch_mailings()
+        return
+
+    metrics = TickMetrics()
+    with metrics.phase('select'):
+        claimed = claim_due_mailings(datetime.now())
+    metrics.count('mailings_due', len(claimed))
+
+    # отправляем очередь целиком, включая письма, оставшиеся от прерванных запусков и ждущие повтора
+    while send_outbox_batch(metrics):
+        pass
+    with metrics.phase('log_write'):
+        write_run_summaries()
+
+    metrics.report()
+
+
+def purge_outbox(now=None):
+    """Удаляет из очереди письма с итогом (отправлено или ошибка) старше MAILING_OUTBOX_RETENTION_DAYS дней
+    и запуски с записанным итогом. Письма удаляются пачками, чтобы не держать долгих блокировок.
+    Возвращает число удалённых писем"""
+    cutoff = (now or datetime.now()) - timedelta(days=settings.MAILING_OUTBOX_RETENTION_DAYS)
+    # next_attempt_at письма с итогом - время последнего взятия в отправку, по нему же есть индекс
+    finished = Outbox.objects.filter(status__in=[Outbox.STATUS_SENT, Outbox.STATUS_FAILED], next_attempt_at__lt=cutoff)
+    deleted = 0
+    while batch_ids := list(finished.values_list('pk', flat=True)[:settings.MAILING_OUTBOX_PURGE_CHUNK_SIZE]):
+        deleted += Outbox.objects.filter(pk__in=batch_ids).delete()[0]
+    MailingRun.objects.filter(summarized=True, run_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,60 @@
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from mailing.models import Client, MailingModel, Message
+from mailing.services import invalidate_schedule
+from mailing.stats import change_owner_stats
+
+
+@receiver([post_save, post_delete], sender=MailingModel)
+@receiver([post_save, post_delete], sender=Message)
+def mailing_changed(sender, **kwargs):
+    """Сбрасывает кеш расписания рассылок при изменении рассылок и писем (получатели в снимок не входят)"""
+    invalidate_schedule()
+
+
+def stats_state(sender, instance):
+    """Чем объект влияет на счётчики пользователя: (пользователь, активна ли рассылка)"""
+    return instance.owner_id, sender is MailingModel and instance.is_active
+
+
+STATS_UNKNOWN = 'unknown'  # объект загружен без нужных полей (only/defer) - изменение поправит сверка
+
+
+def apply_stats_state(sender, state, sign):
+    owner_id, is_active = state
+    if sender is MailingModel:
+        change_owner_stats(owner_id, mailing_amount=sign, active_mailing_amount=sign if is_active else 0)
+    else:
+        change_owner_stats(owner_id, client_amount=sign)
+
+
+@receiver(post_init, sender=MailingModel)
+@receiver(post_init, sender=Client)
+def remember_stats_state(sender, instance, **kwargs):
+    """Запоминает исходные пользователя и активность, чтобы при сохранении учесть только изменение"""
+    if instance.pk is None:
+        instance._stats_state = None
+    elif 'owner_id' in instance.__dict__ and (sender is Client or 'is_active' in instance.__dict__):
+        instance._stats_state = stats_state(sender, instance)
+    else:  # обращение к отложенному полю стоило бы запроса на каждый объект
+        instance._stats_state = STATS_UNKNOWN
+
+
+@receiver(post_save, sender=MailingModel)
+@receiver(post_save, sender=Client)
+def update_stats_on_save(sender, instance, **kwargs):
+    """Обновляет счётчики главной страницы при создании, смене владельца и включении/выключении"""
+    state = stats_state(sender, instance)
+    if instance._stats_state != STATS_UNKNOWN and state != instance._stats_state:
+        if instance._stats_state is not None:
+            apply_stats_state(sender, instance._stats_state, -1)
+        apply_stats_state(sender, state, 1)
+    instance._stats_state = state
+
+
+@receiver(post_delete, sender=MailingModel)
+@receiver(post_delete, sender=Client)
+def update_stats_on_delete(sender, instance, **kwargs):
+    state = instance._stats_state
+    apply_stats_state(sender, stats_state(sender, instance) if state in (None, STATS_UNKNOWN) else state, -1)
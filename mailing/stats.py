@@ -0,0 +1,57 @@
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from mailing.models import Client, MailingModel, OwnerStats
+
+
+def count_owner_stats(owner_id):
+    """Точные значения счётчиков пользователя по таблицам рассылок и клиентов"""
+    mailings = MailingModel.objects.filter(owner=owner_id).aggregate(
+        mailing_amount=Count('pk'), active_mailing_amount=Count('pk', filter=Q(is_active=True))
+    )
+    return {**mailings, 'client_amount': Client.objects.filter(owner=owner_id).count()}
+
+
+def refresh_owner_stats(owner_id):
+    """Пересчитывает и сохраняет счётчики пользователя"""
+    stats, _ = OwnerStats.objects.update_or_create(
+        owner_id=owner_id, defaults={**count_owner_stats(owner_id), 'reconciled_at': timezone.now()}
+    )
+    return stats
+
+
+def get_owner_stats(owner):
+    """Счётчики пользователя одним запросом по первичному ключу, при первом обращении - с подсчётом"""
+    return OwnerStats.objects.filter(owner=owner.pk).first() or refresh_owner_stats(owner.pk)
+
+
+def change_owner_stats(owner_id, **deltas):
+    """Атомарно меняет счётчики пользователя на deltas (поле=изменение). Если записи ещё нет -
+    считает её целиком, изменение к этому моменту уже в базе"""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if owner_id is None or not deltas:
+        return
+    if not OwnerStats.objects.filter(owner=owner_id).update(**{field: F(field) + delta for field, delta in deltas.items()}):
+        refresh_owner_stats(owner_id)
+
+
+def reconcile_owner_stats():
+    """Периодическая сверка: пересчитывает счётчики всех пользователей группирующими запросами
+    и исправляет расхождения (изменения через update() и bulk-операции сигналов не вызывают)"""
+    mailings = {row['owner']: row for row in MailingModel.objects.filter(owner__isnull=False).order_by().values(
+        'owner'
+    ).annotate(mailing_amount=Count('pk'), active_mailing_amount=Count('pk', filter=Q(is_active=True)))}
+    clients = dict(Client.objects.filter(owner__isnull=False).order_by().values('owner').annotate(
+        amount=Count('pk')
+    ).values_list('owner', 'amount'))
+
+    now = timezone.now()
+    stats = list(OwnerStats.objects.all())
+    for owner_stats in stats:
+        row = mailings.get(owner_stats.owner_id, {})
+        owner_stats.mailing_amount = row.get('mailing_amount', 0)
+        owner_stats.active_mailing_amount = row.get('active_mailing_amount', 0)
+        owner_stats.client_amount = clients.get(owner_stats.owner_id, 0)
+        owner_stats.reconciled_at = now
+    OwnerStats.objects.bulk_update(stats, ['mailing_amount', 'active_mailing_amount', 'client_amount', 'reconciled_at'],
+                                   batch_size=500)
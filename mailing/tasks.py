@@ -0,0 +1,52 @@
+from datetime import datetime
+from math import ceil
+
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+
+from mailing.metrics import TickMetrics
+from mailing.models import Outbox
+from mailing.services import claim_due_mailings, send_outbox_batch, write_run_summaries
+
+OUTSTANDING_CACHE_KEY = 'mailing_outbox_tasks'  # сколько задач отправки поставлено в очередь и ещё не завершилось
+
+
+@shared_task
+def dispatch_mailings():
+    """Периодический диспетчер: ставит письма наступивших рассылок в очередь Outbox и запускает задачи отправки:
+    по одной на готовую пачку, но не больше MAILING_OUTBOX_TASKS одновременно с учётом ещё не завершённых.
+    Заодно пишет итоги завершённых запусков"""
+    metrics = TickMetrics()
+    now = datetime.now()
+    with metrics.phase('select'):
+        claimed = claim_due_mailings(now)
+    metrics.count('mailings_due', len(claimed))
+    with metrics.phase('log_write'):
+        write_run_summaries()
+    pending = Outbox.objects.filter(status__in=Outbox.STATUSES_UNFINISHED, next_attempt_at__lte=now).count()
+    needed = min(ceil(pending / settings.MAILING_OUTBOX_BATCH_SIZE), settings.MAILING_OUTBOX_TASKS)
+    new_tasks = max(0, needed - (cache.get(OUTSTANDING_CACHE_KEY) or 0))
+    if new_tasks:
+        # таймаут - подстраховка от задач, которые пропали, не уменьшив счётчик
+        if not cache.add(OUTSTANDING_CACHE_KEY, new_tasks, settings.MAILING_OUTBOX_TASKS_TIMEOUT):
+            cache.incr(OUTSTANDING_CACHE_KEY, new_tasks)
+        for _ in range(new_tasks):
+            send_outbox.delay()
+    metrics.report()
+
+
+@shared_task(acks_late=True)
+def send_outbox():
+    """Отправляет письма из очереди Outbox пачками, пока не останется готовых, повторы временных ошибок
+    планирует сама очередь"""
+    metrics = TickMetrics()
+    try:
+        while send_outbox_batch(metrics):
+            pass
+    finally:
+        try:
+            cache.decr(OUTSTANDING_CACHE_KEY)
+        except ValueError:  # счётчик истёк по таймауту
+            pass
+        metrics.report()
@@ -0,0 +1,49 @@
+from collections import OrderedDict
+
+from django.template import Context, Engine
+
+# отдельный движок для текстов рассылок: без экранирования HTML (письма текстовые)
+# и без загрузчиков шаблонов, чтобы из текста письма нельзя было подключить шаблоны сайта
+engine = Engine(dirs=[], app_dirs=False, loaders=[], autoescape=False)
+
+SAMPLE_CONTEXT = {'name': 'Иван', 'mail': 'ivan@example.com'}  # данные клиента для пробной подстановки
+COMPILED_CACHE_SIZE = 256
+_compiled = OrderedDict()  # (id письма, время изменения) -> (шаблон темы, шаблон текста)
+
+
+def is_personalized(message):
+    """Проверяет, есть ли в письме подстановки, которые нужно заполнять для каждого получателя"""
+    return any('{{' in text or '{%' in text for text in (message.title or '', message.message))
+
+
+def compile_text(text):
+    """Компилирует текст письма как шаблон Django (TemplateSyntaxError при ошибке в подстановках)"""
+    return engine.from_string(text or '')
+
+
+def check_text(text):
+    """Компилирует текст письма и пробно подставляет в него данные клиента: теги вроде {% url %}
+    компилируются без ошибок, а падают только при подстановке"""
+    compile_text(text).render(Context(SAMPLE_CONTEXT))
+
+
+def compile_message(message):
+    """Возвращает скомпилированные тему и текст письма, компилирует их один раз на версию письма"""
+    key = (message.pk, message.updated_at)
+    compiled = _compiled.get(key)
+    if compiled is None:
+        compiled = (compile_text(message.title), compile_text(message.message))
+        _compiled[key] = compiled
+        if len(_compiled) > COMPILED_CACHE_SIZE:
+            _compiled.popitem(last=False)
+    else:
+        _compiled.move_to_end(key)
+    return compiled
+
+
+def render_message(message, name, mail):
+    """Подставляет данные клиента в тему и текст письма"""
+    title, text = compile_message(message)
+    context = Context({'name': name, 'mail': mail})
+    # перевод строки в теме письма сломал бы заголовки
+    return ' '.join(title.render(context).split()), text.render(context)
@@ -1,3 +1,46 @@
-from django.test import TestCase
+from smtplib import SMTPRecipientsRefused
 
-# Create your tests here.
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import SimpleTestCase, override_settings
+from django.urls import NoReverseMatch
+
+from mailing.services import MailDelivery
+from mailing.templating import check_text
+
+
+class RefusingBackend(EmailBackend):
+    """Почтовый бэкенд в памяти, который, как SMTP-сервер, отказывает адресу bad@x.com
+    и прерывает отправку пачки на этом письме"""
+
+    def send_messages(self, messages):
+        for message in messages:
+            if 'bad@x.com' in message.recipients():
+                raise SMTPRecipientsRefused({'bad@x.com': (550, b'no such user')})
+            mail.outbox.append(message)
+        return len(messages)
+
+
+@override_settings(EMAIL_BACKEND='mailing.tests.RefusingBackend')
+class MailDeliveryTest(SimpleTestCase):
+
+    def test_failed_message_does_not_resend_delivered(self):
+        """Отказ в одном письме пачки не приводит к повторной отправке уже доставленных писем"""
+        addresses = ['a1@x.com', 'a2@x.com', 'a3@x.com', 'bad@x.com', 'a4@x.com']
+        messages = [EmailMessage('Тема', 'Текст', 'robot@x.com', [address]) for address in addresses]
+        with MailDelivery() as delivery:
+            errors = delivery.send(messages)
+
+        self.assertEqual([err is None for err in errors], [True, True, True, False, True])
+        self.assertIsInstance(errors[3], SMTPRecipientsRefused)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['a1@x.com', 'a2@x.com', 'a3@x.com', 'a4@x.com'])
+
+
+class CheckTextTest(SimpleTestCase):
+
+    def test_render_error_is_caught_on_check(self):
+        """Тег, который компилируется, но падает при подстановке, отклоняется при проверке текста"""
+        check_text('Здравствуйте, {{ name }}!')
+        with self.assertRaises(NoReverseMatch):
+            check_text("{% url 'no-such-page' %}")
@@ -3,10 +3,11 @@ from django.views.decorators.cache import cache_page
 
 from mailing.views import MailinListView, MessageListView, MessageCreateView, MessageDeleteView, \
     MessageUpdateView, MessageDetailView, MailingCreateView, MailingDeleteView, MailingUpdateView, MailingDetailView, \
-    LogListListView, ClientListView, ClientCreateView, ClientDeleteView, ClientUpdateView, ClientDetailView, \
+    LogListListView, ClientListView, ClientCreateView, ClientImportView, ClientDeleteView, ClientUpdateView, ClientDetailView, \
     RedactMailingClientsListView, add_client_to_mailinglist, \
     delete_client_from_mailinglist, delete_all_clients_from_mailinglist, add_all_clients_to_mailinglist, \
-    change_mailing_is_active, main_page
+    change_mailing_is_active, main_page, mailing_metrics, export_data, change_mailinglist, \
+    mailinglist_clients
 from mailing.apps import MailingConfig
 
 app_name = MailingConfig.name
@@ -30,6 +31,7 @@ urlpatterns = [
 
     path('clients_list/', ClientListView.as_view(), name='clients_list'),
     path('create_client/', ClientCreateView.as_view(), name='create_client'),
+    path('import_clients/', ClientImportView.as_view(), name='import_clients'),
     path('delete_client/<int:pk>/', ClientDeleteView.as_view(), name='delete_client'),
     path('update_client/<int:pk>/', ClientUpdateView.as_view(), name='update_client'),
     path('detail_client/<int:pk>/', ClientDetailView.as_view(), name='detail_client'),
@@ -39,6 +41,12 @@ urlpatterns = [
     path('delete_client_to_mailinglist/<int:pk_client>/<int:pk_mailindmodel>/', delete_client_from_mailinglist, name='delete_client_to_mailinglist'),
     path('delete_all_clients_from_mailinglist/<int:pk_mailindmodel>/', delete_all_clients_from_mailinglist, name='delete_all_clients_from_mailinglist'),
     path('add_all_clients_to_mailinglist/<int:pk_mailindmodel>/', add_all_clients_to_mailinglist, name='add_all_clients_to_mailinglist'),
+    path('mailinglist_clients/<int:pk_mailindmodel>/<side>/', mailinglist_clients, name='mailinglist_clients'),
+    path('change_mailinglist/<int:pk_mailindmodel>/', change_mailinglist, name='change_mailinglist'),
+
+    path('export/<kind>/<file_format>/', export_data, name='export'),
+
+    path('metrics/', mailing_metrics, name='metrics'),
 
     path('', main_page, name='main_page'),
 
@@ -1,16 +1,23 @@
-from random import sample
-
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import Http404
-from django.shortcuts import render, redirect
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.messages import success
 from django.urls import reverse, reverse_lazy
-from django.views.generic import ListView, DetailView, CreateView, DeleteView, UpdateView
-
-from blog.models import Blog
-from mailing.forms import MailingModelForm, ClientForm, MessageForm
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_POST
+from django.views.generic import ListView, DetailView, CreateView, DeleteView, UpdateView, FormView, TemplateView
+
+from blog.services import get_featured_cards
+from mailing.forms import MailingModelForm, ClientForm, MessageForm, ClientImportForm
+from mailing.exporters import EXPORTS, FORMATS, export_lines
+from mailing.importers import ClientImportError, detect_format, import_clients
+from mailing.membership import add_clients, mailing_clients_page, remove_clients, select_clients
+from mailing.metrics import render_prometheus
 from mailing.models import Client, MailingModel, Message, MailingList, LogList
+from mailing.pagination import KeysetPaginator
+from mailing.retention import get_daily_totals
+from mailing.stats import get_owner_stats
 from django.conf import settings
 
 
@@ -22,10 +29,21 @@ class UserRequiredMixin:  # миксин блокирует доступ пол
         return self.object
 
 
-class MailinListView(LoginRequiredMixin, ListView):
+class KeysetPaginationMixin:  # миксин листает список по ключу сортировки (курсоры after/before) вместо номера страницы
+    paginate_by = 10
+    keyset_ordering = ('-time', '-id')
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size, self.keyset_ordering,
+                                    estimate_count=settings.MAILING_ESTIMATED_COUNT)
+        page = paginator.page(self.request.GET.get('after'), self.request.GET.get('before'))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+
+class MailinListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """Показывает страницу с рассылками пользователя"""
     model = MailingModel
-    paginate_by = 10
+    keyset_ordering = ('time_from', 'id')
 
     def get_queryset(self):
         return super().get_queryset().filter(
@@ -75,15 +93,15 @@ def change_mailing_is_active(request, **kwargs):
     model = MailingModel.objects.get(id=kwargs['pk'])
     if model.owner != request.user:
         raise Http404
-    model.is_active = kwargs['act']
+    model.is_active = kwargs['act'] == 'True'  # из url приходит строка 'True' / 'False'
     model.save()
     return redirect(reverse('mailing:mailing_list'))
 
 
-class MessageListView(LoginRequiredMixin, ListView):
+class MessageListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """Показывает страницу с текстами рассылок"""
     model = Message
-    paginate_by = 10
+    keyset_ordering = ('name', 'id')
 
     def get_queryset(self):
         return super().get_queryset().filter(
@@ -122,21 +140,25 @@ class MessageDetailView(LoginRequiredMixin, UserRequiredMixin, DetailView):
     model = Message
 
 
-class LogListListView(LoginRequiredMixin, ListView):
-    """Показывает журнал проведённых рассылок"""
+class LogListListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
+    """Показывает журнал проведённых рассылок и итоги запусков по дням"""
     model = LogList
-    paginate_by = 10
 
     def get_queryset(self):
         return super().get_queryset().filter(
             owner=self.request.user
         )
 
+    def get_context_data(self, **kwargs):
+        context_data = super().get_context_data(**kwargs)
+        context_data['daily_totals'] = get_daily_totals(self.request.user)  # готовые итоги, журнал не пересчитывается
+        return context_data
+
 
-class ClientListView(LoginRequiredMixin, ListView):
+class ClientListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """Показывает всех клиентов для рассылок в базе"""
     model = Client
-    paginate_by = 10
+    keyset_ordering = ('name', 'id')
 
     def get_queryset(self):
         return super().get_queryset().filter(
@@ -157,6 +179,25 @@ class ClientCreateView(LoginRequiredMixin, CreateView):
         return super().form_valid(form)
 
 
+class ClientImportView(LoginRequiredMixin, FormView):
+    """Импортирует клиентов для рассылок из файла CSV или JSONL"""
+    form_class = ClientImportForm
+    template_name = 'mailing/client_import.html'
+    success_url = reverse_lazy('mailing:clients_list')
+
+    def form_valid(self, form):
+        upload = form.cleaned_data['file']
+        file_format = form.cleaned_data['file_format'] or detect_format(upload.name)
+        try:
+            stats = import_clients(upload.file, self.request.user, file_format)
+        except ClientImportError as err:
+            form.add_error('file', str(err))
+            return self.form_invalid(form)
+        success(self.request, f'Импорт завершён: добавлено {stats["created"]}, дубликатов {stats["duplicates"]}, '
+                              f'некорректных строк {stats["invalid"]}')
+        return super().form_valid(form)
+
+
 class ClientDeleteView(LoginRequiredMixin, UserRequiredMixin, DeleteView):
     """Удаляет клиента из базы для рассылок"""
     model = Client
@@ -177,100 +218,150 @@ class ClientDetailView(LoginRequiredMixin, UserRequiredMixin, DetailView):
 
 ###########################################################################################################
 # Блок добавления и удаления клиентов из рассылки
-class RedactMailingClientsListView(LoginRequiredMixin, ListView):
-    """Управляет страницей с добавлением и удалением клиентов из рассылки"""
-    model = MailingList
+def get_user_mailing(request, pk):
+    """Рассылка пользователя (404, если рассылка чужая)"""
+    mailing = get_object_or_404(MailingModel, id=pk)
+    if mailing.owner != request.user:
+        raise Http404
+    return mailing
+
+
+MAILINGLIST_SIDES = {'in': True, 'out': False}  # клиенты в рассылке / не в рассылке
+
+
+def get_mailinglist_side(request, mailing, side, prefix=''):
+    """Страница одной стороны редактора: клиенты, поиск и ссылка на следующую страницу"""
+    query = request.GET.get(f'{prefix}q', '').strip()
+    after = request.GET.get(f'{prefix}after', '')
+    clients, next_after = mailing_clients_page(mailing, MAILINGLIST_SIDES[side], query,
+                                               int(after) if after.isdigit() else None)
+    params = request.GET.copy()
+    params.pop(f'{prefix}after', None)
+    first_url = f'?{params.urlencode()}' if after else None
+    next_url = None
+    if next_after:
+        params[f'{prefix}after'] = next_after
+        next_url = f'?{params.urlencode()}'
+    return {'clients': clients, 'q': query, 'next_after': next_after, 'first_url': first_url, 'next_url': next_url}
+
+
+class RedactMailingClientsListView(LoginRequiredMixin, TemplateView):
+    """Управляет страницей с добавлением и удалением клиентов из рассылки.
+    Обе стороны (в рассылке / не в рассылке) листаются по страницам и ищутся отдельно"""
     template_name = 'mailing/redact_mailing_clients.html'
 
     def get_context_data(self, **kwargs):
-        # проверка, что данные запрашивает владелец
-        if MailingModel.objects.get(id=self.kwargs['pk']).owner != self.request.user:
-            raise Http404
+        mailing = get_user_mailing(self.request, self.kwargs['pk'])  # проверка, что данные запрашивает владелец
 
         context_data = super().get_context_data(**kwargs)
-        mailings = super().get_queryset().filter(mailing_model_id=self.kwargs['pk'])
-
-        emails_not_in_mailinglist = Client.objects.filter(owner=self.request.user)
-        emails_not_in_mailinglist = emails_not_in_mailinglist.exclude(id__in=mailings.values_list('client_id', flat=True))
-        emails_in_mailinglist = Client.objects.filter(id__in=mailings.values_list('client_id', flat=True), owner=self.request.user)
-
-        context_data['emails_not_in_mailinglist'] = emails_not_in_mailinglist
-        context_data['emails_in_mailinglist'] = emails_in_mailinglist
+        context_data['emails_in_mailinglist'] = get_mailinglist_side(self.request, mailing, 'in', 'in_')
+        context_data['emails_not_in_mailinglist'] = get_mailinglist_side(self.request, mailing, 'out', 'out_')
         context_data['pk_mailindmodel'] = self.kwargs['pk']
 
         return context_data
 
 
-    def get_queryset(self):
-        return super().get_queryset().filter(
-            mailing_model_id=self.kwargs['pk'],
-            owner=self.request.user)
+@login_required
+def mailinglist_clients(request, **kwargs):
+    """Следующая страница или результаты поиска одной стороны редактора: фрагмент HTML или JSON (?format=json)"""
+    if kwargs['side'] not in MAILINGLIST_SIDES:
+        raise Http404
+    mailing = get_user_mailing(request, kwargs['pk_mailindmodel'])
+    page = get_mailinglist_side(request, mailing, kwargs['side'])
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'results': [{'id': client.pk, 'name': client.name, 'mail': client.mail, 'is_active': client.is_active}
+                        for client in page['clients']],
+            'next_after': page['next_after'],
+        })
+    return render(request, 'mailing/includes/redact_mailing_clients_rows.html',
+                  {'page': page, 'side': kwargs['side'], 'pk_mailindmodel': mailing.pk})
 
 
 @login_required
 def add_client_to_mailinglist(request, **kwargs):
     """Добавляет клиента из Client в рассылку MailingList"""
-    if Client.objects.get(id=kwargs['pk_client']).owner != request.user:  # проверка, что это клиент пользователя
-        raise Http404
-    MailingList.objects.create(mailing_model_id=kwargs['pk_mailindmodel'], client_id=kwargs['pk_client'], owner=request.user)
+    mailing = get_user_mailing(request, kwargs['pk_mailindmodel'])
+    add_clients(mailing, select_clients(request.user, client_ids=[kwargs['pk_client']]))
     return redirect(reverse('mailing:redact_mailing_clients', args=[kwargs['pk_mailindmodel']]))
 
 @login_required
 def delete_client_from_mailinglist(request, **kwargs):
     """Удаляет клиента из Client из рассылки MailingList"""
-    instance = MailingList.objects.filter(mailing_model_id=kwargs['pk_mailindmodel'], client_id=kwargs['pk_client'])
-    if instance[0].owner != request.user:  # проверка, что это клиент пользователя
-        raise Http404
-    instance.delete()
+    mailing = get_user_mailing(request, kwargs['pk_mailindmodel'])
+    remove_clients(mailing, select_clients(request.user, client_ids=[kwargs['pk_client']]))
     return redirect(reverse('mailing:redact_mailing_clients', args=[kwargs['pk_mailindmodel']]))
 
 @login_required
 def delete_all_clients_from_mailinglist(request, **kwargs):
-    """Добавляет всех не добавленных клиентов (хранятся Client) в рассылку MailingList"""
-    instance = MailingList.objects.filter(mailing_model_id=kwargs['pk_mailindmodel'])
-    if instance and instance[0].owner != request.user:  # проверка, что это клиент пользователя
-        raise Http404
-    instance.delete()
+    """Удаляет всех клиентов (хранятся Client) из рассылки MailingList"""
+    mailing = get_user_mailing(request, kwargs['pk_mailindmodel'])
+    remove_clients(mailing, select_clients(request.user))
     return redirect(reverse('mailing:redact_mailing_clients', args=[kwargs['pk_mailindmodel']]))
 
 @login_required
 def add_all_clients_to_mailinglist(request, **kwargs):
-    """Удаляет всех клиентов (хранятся Client) из рассылки MailingList"""
-    if MailingModel.objects.get(id=kwargs['pk_mailindmodel']).owner != request.user:  # проверка, что это клиент пользователя
-        raise Http404
-    already_in_mailinglist = MailingList.objects.filter(mailing_model_id=kwargs['pk_mailindmodel'])
-    emails_not_in_mailinglist = Client.objects.filter(owner=request.user)
-    emails_not_in_mailinglist = emails_not_in_mailinglist.exclude(id__in=already_in_mailinglist.values_list('client_id', flat=True))
-    mailing_list = []
-    for client_id in emails_not_in_mailinglist.values_list('id', flat=True):
-        mailing_list.append(
-            MailingList(mailing_model_id=kwargs['pk_mailindmodel'], client_id=client_id, owner=request.user)
-        )
-    MailingList.objects.bulk_create(mailing_list)
-
+    """Добавляет всех не добавленных клиентов (хранятся Client) в рассылку MailingList"""
+    mailing = get_user_mailing(request, kwargs['pk_mailindmodel'])
+    add_clients(mailing, select_clients(request.user))
     return redirect(reverse('mailing:redact_mailing_clients', args=[kwargs['pk_mailindmodel']]))
+
+@login_required
+@require_POST
+def change_mailinglist(request, **kwargs):
+    """Массово добавляет или удаляет клиентов рассылки: отмеченных (client_ids) или найденных поиском (q)"""
+    mailing = get_user_mailing(request, kwargs['pk_mailindmodel'])
+    redirect_url = reverse('mailing:redact_mailing_clients', args=[kwargs['pk_mailindmodel']])
+    client_ids = None  # id не переданы - действие относится ко всем клиентам (с учётом поиска)
+    if 'client_ids' in request.POST:
+        client_ids = [int(pk) for pk in request.POST.getlist('client_ids') if pk.isdigit()]
+        if not client_ids:  # переданы, но ни одного корректного - ничего не меняем
+            return redirect(redirect_url)
+    clients = select_clients(request.user, client_ids=client_ids, query=request.POST.get('q', '').strip())
+    if request.POST.get('action') == 'remove':
+        remove_clients(mailing, clients)
+    else:
+        add_clients(mailing, clients)
+    return redirect(redirect_url)
 #####################################################################################################
 
 
+@login_required
+def export_data(request, **kwargs):
+    """Отдаёт клиентов, списки рассылок или журнал пользователя файлом CSV/JSONL, не загружая их в память"""
+    if kwargs['kind'] not in EXPORTS or kwargs['file_format'] not in FORMATS:
+        raise Http404
+    response = StreamingHttpResponse(export_lines(kwargs['kind'], request.user, kwargs['file_format']),
+                                     content_type=FORMATS[kwargs['file_format']])
+    response['Content-Disposition'] = f'attachment; filename="{kwargs["kind"]}.{kwargs["file_format"]}"'
+    return response
+
+
+def mailing_metrics(request):
+    """Отдаёт метрики планировщика рассылок в формате Prometheus.
+    Доступно персоналу или по токену MAILING_METRICS_TOKEN в заголовке Authorization: Bearer <токен>"""
+    token = settings.MAILING_METRICS_TOKEN
+    has_token = bool(token) and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not (has_token or request.user.is_staff):
+        raise Http404
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @login_required
 def main_page(request):
     """Главная страница"""
 
-    #  выбираем три случайных поста из блога
-    pks = list(Blog.objects.values_list('pk', flat=True))
-    random_pk = sample(pks, 3)
-    random_obj = Blog.objects.filter(pk__in=random_pk)
+    #  три случайных поста из блога - готовые карточки из кеша
+    featured_posts = get_featured_cards()
 
-    #  выбираем общее количество рассылок и клиентов
-    mailing_amount = (MailingModel.objects.filter(owner=request.user)).count()
-    active_mailing_amount = (MailingModel.objects.filter(is_active=True, owner=request.user)).count()
-    client_amount = (Client.objects.filter(owner=request.user)).count()
+    #  количество рассылок и клиентов - из счётчиков пользователя, которые обновляются сигналами
+    stats = get_owner_stats(request.user)
 
     context = {
-        'object_list': random_obj,
-        'mailing_amount': mailing_amount,
-        'active_mailing_amount': active_mailing_amount,
-        'client_amount': client_amount
+        'featured_posts': featured_posts,
+        'mailing_amount': stats.mailing_amount,
+        'active_mailing_amount': stats.active_mailing_amount,
+        'client_amount': stats.client_amount
     }
 
     return render(request, 'mailing/index.html', context)
\ No newline at end of file